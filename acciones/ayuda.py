@@ -33,6 +33,8 @@ def ayuda(categoria: str = None) -> str:
             "Muestra tus estadísticas personales de uso de Llama.\n\n"
             "**>llama_stats True**\n"
             "Muestra las estadísticas globales del día para la IA Llama.\n\n"
+            "**>llama_stats [True] 7d|30d**\n"
+            "Estadísticas (tuyas o globales) de los últimos 7 o 30 días.\n\n"
             "**>llama_dashboard**\n"
             "Visualiza un resumen visual (tabla) de las métricas globales de la IA Llama.\n\n"
             "**>deepseek [--lang código] [pregunta]**\n"
@@ -51,6 +53,8 @@ def ayuda(categoria: str = None) -> str:
         return (
             "**>tateti**\n"
             "Juega tateti contra el bot o un amigo.\n\n"
+            "**>tateti_ranking**\n"
+            "Muestra quién ganó más partidas de tateti.\n\n"
             "**>adivina**\n"
             "Adivina la letra oculta.\n\n"
             "**>chiste**\n"
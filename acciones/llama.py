@@ -1,60 +1,184 @@
 import asyncio
-import datetime
 
+import httpx
 import pytz
-from discord import Embed
-from groq import Groq
-
-from base.database import add_response_time, increment_llama_metric
-from config.lla_config import GROQ_API_KEY, GROQ_MODEL
+from groq import AsyncGroq
+
+from base.database import get_today_tokens_by_user, today_uy
+from base.metrics_aggregator import LlamaMetricsAggregator
+from base.response_cache import ResponseCache, cache_key
+from config.lla_config import (
+    GROQ_API_KEY,
+    GROQ_CONNECT_TIMEOUT,
+    GROQ_KEEPALIVE_SECONDS,
+    GROQ_MODEL,
+    GROQ_READ_TIMEOUT,
+    LLAMA_GLOBAL_DAILY_TOKENS,
+    LLAMA_MAX_CONCURRENCY,
+    LLAMA_METRICS_FLUSH_INTERVAL,
+    LLAMA_RESPONSE_CACHE_PERSIST,
+    LLAMA_RESPONSE_CACHE_SIZE,
+    LLAMA_RESPONSE_CACHE_TTL,
+    LLAMA_TOKEN_RESERVE,
+    LLAMA_USER_DAILY_TOKENS,
+)
 
 # Configurar la zona horaria de Uruguay
 URUGUAY_TZ = pytz.timezone("America/Montevideo")
 
+# Colores para rotación en los embeds de respuesta
+RESPONSE_EMBED_COLORS = [0x00FF00, 0x0099FF, 0xFF9900, 0xFF0099, 0x9900FF]
+
 
-# TokenManager puede mantenerse si deseas un límite diario adicional, pero las métricas reales se guardan en la base de datos.
 class TokenManager:
-    def __init__(self, daily_limit=500, tokens_per_request=10):
-        self.daily_limit = daily_limit
-        self.tokens_per_request = tokens_per_request
-        self.tokens_used = 0
-        now_uy = datetime.datetime.now(URUGUAY_TZ)
-        tomorrow_uy = now_uy.date() + datetime.timedelta(days=1)
-        self.reset_time = URUGUAY_TZ.localize(
-            datetime.datetime.combine(tomorrow_uy, datetime.datetime.min.time())
-        )
+    """
+    Cuotas diarias de tokens por usuario y globales.
+
+    Los contadores viven en memoria (chequeo O(1) por consulta) y se cobran con
+    los tokens reales que informa la API. Su persistencia es la columna
+    tokens_used de llama_metrics, que metrics_aggregator vuelca periódicamente;
+    al arrancar, seed() los recarga desde ahí para que sobrevivan reinicios.
+    Se reinician al cambiar el día en Montevideo.
+
+    Mientras una consulta está en curso su costo todavía no se conoce, así que
+    reserve() aparta una estimación que cuenta para los límites hasta que
+    release() la libera y use_tokens() cobra el costo real.
+    """
+
+    def __init__(self, user_daily_limit=20000, global_daily_limit=100000):
+        self.user_daily_limit = user_daily_limit
+        self.global_daily_limit = global_daily_limit
+        self.day = today_uy()
+        self.used_by_user: dict[str, int] = {}
+        self.used_total = 0
+        # Estimaciones apartadas por las consultas en curso
+        self.reserved_by_user: dict[str, int] = {}
+        self.reserved_total = 0
 
     def reset_tokens(self):
-        if datetime.datetime.now(URUGUAY_TZ) >= self.reset_time:
-            self.tokens_used = 0
-            now_uy = datetime.datetime.now(URUGUAY_TZ)
-            tomorrow_uy = now_uy.date() + datetime.timedelta(days=1)
-            self.reset_time = URUGUAY_TZ.localize(
-                datetime.datetime.combine(tomorrow_uy, datetime.datetime.min.time())
-            )
+        today = today_uy()
+        if today != self.day:
+            self.day = today
+            # Las reservas se conservan: son de consultas que siguen en curso
+            self.used_by_user = {}
+            self.used_total = 0
+
+    async def seed(self):
+        """Carga lo consumido hoy desde llama_metrics."""
+        usage = await get_today_tokens_by_user()
+        self.day = today_uy()
+        self.used_by_user = dict(usage)
+        self.used_total = sum(self.used_by_user.values())
+
+    def _user_committed(self, key: str) -> int:
+        return self.used_by_user.get(key, 0) + self.reserved_by_user.get(key, 0)
+
+    def user_exhausted(self, user_id) -> bool:
+        self.reset_tokens()
+        return self._user_committed(str(user_id)) >= self.user_daily_limit
 
-    def can_use_tokens(self) -> bool:
+    def global_exhausted(self) -> bool:
         self.reset_tokens()
-        return self.tokens_used + self.tokens_per_request <= self.daily_limit
+        return self.used_total + self.reserved_total >= self.global_daily_limit
 
-    def use_tokens(self) -> bool:
-        if self.can_use_tokens():
-            self.tokens_used += self.tokens_per_request
-            return True
-        return False
+    def can_use_tokens(self, user_id) -> bool:
+        """
+        True si al usuario y al bot les queda cuota hoy, contando lo reservado.
 
+        Como el costo real se conoce recién con la respuesta, el límite se puede
+        superar por lo que las consultas en curso gasten de más sobre su reserva.
+        """
+        return not self.user_exhausted(user_id) and not self.global_exhausted()
 
-# Helper para registrar métricas desde comandos
-async def registrar_metricas_llama(
-    user_id, tokens_usados, response_time, fue_archivo=False, fallo_api=False
+    def reserve(self, user_id, tokens: int) -> bool:
+        """
+        Aparta `tokens` de la cuota si todavía queda; si no, no reserva nada.
+
+        El chequeo y la reserva no ceden el event loop, así que dos consultas
+        simultáneas no pueden ver la misma cuota libre.
+
+        Returns:
+            bool: True si la consulta puede seguir
+        """
+        if not self.can_use_tokens(user_id):
+            return False
+        key = str(user_id)
+        self.reserved_by_user[key] = self.reserved_by_user.get(key, 0) + tokens
+        self.reserved_total += tokens
+        return True
+
+    def release(self, user_id, tokens: int) -> None:
+        """Libera una reserva hecha con reserve()."""
+        key = str(user_id)
+        left = self.reserved_by_user.get(key, 0) - tokens
+        if left > 0:
+            self.reserved_by_user[key] = left
+        else:
+            self.reserved_by_user.pop(key, None)
+        self.reserved_total = max(self.reserved_total - tokens, 0)
+
+    def use_tokens(self, user_id, tokens: int) -> None:
+        """Cobra los tokens reales (prompt + completion) de una consulta."""
+        self.reset_tokens()
+        key = str(user_id)
+        self.used_by_user[key] = self.used_by_user.get(key, 0) + tokens
+        self.used_total += tokens
+
+    def remaining(self, user_id) -> tuple[int, int]:
+        """Tokens que le quedan hoy al usuario y al bot, descontando las reservas."""
+        self.reset_tokens()
+        return (
+            max(self.user_daily_limit - self._user_committed(str(user_id)), 0),
+            max(self.global_daily_limit - self.used_total - self.reserved_total, 0),
+        )
+
+
+# Helper para registrar métricas desde comandos.
+# Solo acumula en memoria; metrics_aggregator las vuelca en lote a la BD.
+# first_token_time (segundos) es None si no llegó ningún token.
+def registrar_metricas_llama(
+    user_id,
+    tokens_usados,
+    response_time,
+    fallo_api=False,
+    first_token_time=None,
 ):
-    increment_llama_metric(user_id, "llama_uses")
-    increment_llama_metric(user_id, "tokens_used", tokens_usados)
-    add_response_time(user_id, response_time)
-    if fue_archivo:
-        increment_llama_metric(user_id, "responses_as_file")
-    if fallo_api:
-        increment_llama_metric(user_id, "api_failures")
+    metrics_aggregator.record(
+        user_id,
+        llama_uses=1,
+        tokens_used=tokens_usados,
+        total_response_time=int(response_time),
+        api_failures=int(fallo_api),
+        total_first_token_ms=(
+            int(first_token_time * 1000) if first_token_time is not None else 0
+        ),
+        first_token_count=int(first_token_time is not None),
+    )
+
+
+class GroqStream:
+    """
+    Respuesta de Groq en streaming.
+
+    Se itera con `async for` y entrega los fragmentos de texto a medida que
+    llegan. Groq informa el uso real en el último chunk (x_groq.usage), así
+    que `tokens` recién es válido al terminar la iteración.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.tokens = 0
+
+    async def __aiter__(self):
+        async for chunk in self._chunks:
+            usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None)
+            if usage is not None:
+                self.tokens = usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aclose(self):
+        await self._chunks.aclose()
 
 
 class GroqHandler:
@@ -66,12 +190,17 @@ class GroqHandler:
     ):
         """Inicializa el manejador de Groq con la API key y el modelo especificados."""
 
-        self.client = Groq(api_key=api_key)
+        self.api_key = api_key
 
-        self.client.model = model
+        self.model = model
 
         self.temperature = temperature
 
+        # Limita las consultas simultáneas a Groq; las demás esperan su turno
+        # en el event loop sin ocupar hilos ni conexiones
+        self._semaphore = asyncio.Semaphore(LLAMA_MAX_CONCURRENCY)
+        self._client: AsyncGroq | None = None
+
         self.system_message = (
             "Eres un asistente experto en Python, especializado en el desarrollo de software. "
             "Tu objetivo es ayudar a desarrolladores junior a mejorar sus habilidades en Python. "
@@ -79,96 +208,104 @@ class GroqHandler:
             "Por favor, asegúrate de que tus respuestas sean claras, concisas y orientadas a la enseñanza."
         )
 
-    def _get_response_sync(self, user_message: str) -> str:
-        """Obtiene la respuesta del modelo Groq de manera síncrona."""
-
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": self.system_message},
-                {"role": "user", "content": user_message},
-            ],
-            model=self.client.model,
-            temperature=self.temperature,
-        )
-
-        return chat_completion.choices[0].message.content
+    @property
+    def client(self) -> AsyncGroq:
+        """
+        Cliente async de Groq sobre un pool de conexiones keep-alive propio.
 
-    async def get_response(self, user_message: str) -> str:
-        """Obtiene la respuesta del modelo Groq de manera asincrónica usando un thread."""
+        Se crea al primer uso y se vuelve a crear si close() lo cerró (por
+        ejemplo, al recargar el cog). Las peticiones son I/O del event loop:
+        no usan el executor por defecto que comparte asyncio.to_thread.
+        """
+        if self._client is None or self._client.is_closed():
+            self._client = AsyncGroq(
+                api_key=self.api_key,
+                max_retries=2,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=LLAMA_MAX_CONCURRENCY,
+                        max_keepalive_connections=LLAMA_MAX_CONCURRENCY,
+                        keepalive_expiry=GROQ_KEEPALIVE_SECONDS,
+                    ),
+                    timeout=httpx.Timeout(
+                        GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT
+                    ),
+                ),
+            )
+        return self._client
 
-        # Usar to_thread para ejecutar la función síncrona en un hilo separado
+    async def close(self) -> None:
+        """Cierra el pool de conexiones."""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
 
-        return await asyncio.to_thread(self._get_response_sync, user_message)
+    def cache_key(self, user_message: str) -> str:
+        """Clave de la pregunta en response_cache para este modelo y temperatura."""
+        return cache_key(user_message, self.model, self.temperature)
 
-    def create_response_embed(self, username: str, response: str) -> Embed:
-        """Crea un embed para la respuesta del bot (solo para respuestas cortas)."""
-        embed = Embed(
-            title="Respuesta del Asistente de Python",
-            description=response,
-            color=0x00FF00,  # Color verde
-            timestamp=datetime.datetime.now(URUGUAY_TZ),
-        )
-        embed.set_footer(text=f"Pedido por {username}", icon_url=None)
-        return embed
+    def _messages(self, user_message: str) -> list[dict]:
+        return [
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": user_message},
+        ]
 
-    def create_response_embeds(self, username: str, response: str) -> list[Embed]:
+    async def _stream_chunks(self, user_message: str):
         """
-        Crea múltiples embeds para respuestas largas, similar al sistema de DeepSeek.
-        Solo el último embed tendrá timestamp y footer.
+        Genera los chunks del stream de Groq a medida que llegan.
+
+        La consulta ocupa un lugar del semáforo mientras dura el stream. Si el
+        consumidor deja de iterar, la respuesta HTTP se cierra enseguida.
         """
-        # Dividir el mensaje en trozos para los embeds (Discord limita a 4096 caracteres por embed)
-        chunks = [response[i : i + 4096] for i in range(0, len(response), 4096)]
-
-        embeds = []
-        colors = [
-            0x00FF00,
-            0x0099FF,
-            0xFF9900,
-            0xFF0099,
-            0x9900FF,
-        ]  # Colores para rotación
-
-        # Crear cada embed
-        for i, chunk in enumerate(chunks):
-            # Rotar colores
-            current_color = colors[i % len(colors)]
-
-            # Solo el último embed tendrá timestamp y footer
-            if i == len(chunks) - 1:  # Último embed
-                embed = Embed(
-                    title="Respuesta del Asistente de Python" if i == 0 else None,
-                    description=chunk,
-                    color=current_color,
-                    timestamp=datetime.datetime.now(URUGUAY_TZ),
-                )
-                embed.set_footer(text=f"Pedido por {username}", icon_url=None)
-            else:
-                embed = Embed(
-                    title="Respuesta del Asistente de Python" if i == 0 else None,
-                    description=chunk,
-                    color=current_color,
-                )
-
-            embeds.append(embed)
-
-        return embeds
+        async with self._semaphore:
+            stream = await self.client.chat.completions.create(
+                messages=self._messages(user_message),
+                model=self.model,
+                temperature=self.temperature,
+                stream=True,
+            )
+            async with stream:
+                async for chunk in stream:
+                    yield chunk
+
+    def stream_response(self, user_message: str) -> GroqStream:
+        """Pide la respuesta en streaming; ver GroqStream."""
+        return GroqStream(self._stream_chunks(user_message))
 
 
 # Inicializar instancias globales para usar en otros módulos
-token_manager = TokenManager()
+token_manager = TokenManager(
+    user_daily_limit=LLAMA_USER_DAILY_TOKENS,
+    global_daily_limit=LLAMA_GLOBAL_DAILY_TOKENS,
+)
+metrics_aggregator = LlamaMetricsAggregator(flush_interval=LLAMA_METRICS_FLUSH_INTERVAL)
+response_cache = ResponseCache(
+    maxsize=LLAMA_RESPONSE_CACHE_SIZE,
+    ttl=LLAMA_RESPONSE_CACHE_TTL,
+    persist=LLAMA_RESPONSE_CACHE_PERSIST,
+)
 groq_handler = GroqHandler(api_key=GROQ_API_KEY, model=GROQ_MODEL)
 
 
 class GroqSession:
-    """Context manager asíncrono para manejar sesiones con tokens."""
+    """
+    Context manager asíncrono que reserva cuota del usuario antes de consultar.
+
+    Al entrar aparta `estimate` tokens (o devuelve False si no queda cuota);
+    dentro del bloque el llamador cobra el costo real con use_tokens() y al
+    salir la reserva se libera, haya terminado bien o con error.
+    """
 
-    def __init__(self, token_manager):
+    def __init__(self, token_manager, user_id, estimate=LLAMA_TOKEN_RESERVE):
         self.token_manager = token_manager
+        self.user_id = str(user_id)
+        self.estimate = estimate
         self.allowed = False
 
     async def __aenter__(self):
-        self.allowed = self.token_manager.use_tokens()
+        self.allowed = self.token_manager.reserve(self.user_id, self.estimate)
         return self.allowed
 
     async def __aexit__(self, exc_type, exc, tb):
-        pass  # Aquí puedes loggear errores si lo deseas
+        if self.allowed:
+            self.token_manager.release(self.user_id, self.estimate)
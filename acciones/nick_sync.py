@@ -0,0 +1,145 @@
+"""
+Sincronización en segundo plano de los apodos con copas de >gracias.
+
+Cada 20 agradecimientos un miembro gana una copa (🏆) en el apodo. Editar
+miembros tiene un límite de Discord estricto por servidor, así que en vez de
+llamar a member.edit() en cada agradecimiento:
+
+- solo se encola una edición si la cantidad de copas cambia respecto de la que
+  ya muestra el apodo;
+- las ráfagas se agrupan por miembro: si llegan varios agradecimientos antes de
+  editar, se aplica únicamente el último nivel;
+- cada servidor tiene su propio worker con un token bucket, de modo que una
+  ola de agradecimientos no bloquea el cliente HTTP ni al resto de comandos.
+"""
+
+import asyncio
+import logging
+import time
+
+import discord
+
+from config.gracias_config import NICK_EDIT_BURST, NICK_EDIT_REFILL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+THANKS_PER_TROPHY = 20
+TROPHY = "🏆"
+
+
+def trophy_tier(thanks_count: int) -> int:
+    return thanks_count // THANKS_PER_TROPHY
+
+
+def _current_tier(member) -> int:
+    """Copas que muestra hoy el apodo del miembro."""
+    return (member.nick or "").count(TROPHY)
+
+
+class _GuildBucket:
+    """Token bucket de ediciones de miembros para un servidor."""
+
+    def __init__(self, burst: int, refill_seconds: float):
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) / self.refill_seconds
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.refill_seconds)
+
+
+class NicknameSyncer:
+    """Cola de ediciones de apodo agrupadas por miembro y limitadas por servidor."""
+
+    def __init__(
+        self,
+        burst: int = NICK_EDIT_BURST,
+        refill_seconds: float = NICK_EDIT_REFILL_SECONDS,
+    ):
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        # guild_id -> {member_id: (member, nivel)}; el último nivel pisa al anterior
+        self._pending: dict[int, dict[int, tuple[discord.Member, int]]] = {}
+        # (guild_id, member_id) -> nivel ya aplicado (o descartado) por el bot
+        self._applied: dict[tuple[int, int], int] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._buckets: dict[int, _GuildBucket] = {}
+        self.edits = 0
+        self.skipped = 0
+        self.coalesced = 0
+
+    def request(self, member: discord.Member, thanks_count: int) -> bool:
+        """
+        Pide mostrar las copas que corresponden a `thanks_count`.
+
+        Returns:
+            bool: True si se encoló una edición; False si el apodo ya está al día
+        """
+        tier = trophy_tier(thanks_count)
+        key = (member.guild.id, member.id)
+        current = self._applied.get(key, _current_tier(member))
+        pending = self._pending.setdefault(member.guild.id, {})
+        if tier <= 0 or (tier == current and member.id not in pending):
+            self.skipped += 1
+            return False
+        if member.id in pending:
+            self.coalesced += 1
+        pending[member.id] = (member, tier)
+        self._ensure_worker(member.guild.id)
+        return True
+
+    def _ensure_worker(self, guild_id: int) -> None:
+        worker = self._workers.get(guild_id)
+        if worker is None or worker.done():
+            self._workers[guild_id] = asyncio.create_task(self._run(guild_id))
+
+    async def _run(self, guild_id: int) -> None:
+        bucket = self._buckets.setdefault(
+            guild_id, _GuildBucket(self.burst, self.refill_seconds)
+        )
+        pending = self._pending[guild_id]
+        while pending:
+            await bucket.acquire()
+            if not pending:
+                break
+            # El más antiguo primero; lo que llegue mientras tanto se agrupa
+            member_id = next(iter(pending))
+            member, tier = pending.pop(member_id)
+            await self._apply(member, tier)
+
+    async def _apply(self, member: discord.Member, tier: int) -> None:
+        key = (member.guild.id, member.id)
+        if self._applied.get(key, _current_tier(member)) == tier:
+            self.skipped += 1
+            return
+        try:
+            await member.edit(nick=f"{member.name} {TROPHY * tier}")
+            self.edits += 1
+        except discord.Forbidden:
+            # Dueño del servidor o rol superior al del bot: no reintentar
+            logger.info(f"Sin permiso para cambiar el apodo de {member}")
+        except discord.HTTPException as e:
+            logger.warning(f"No se pudo actualizar el apodo de {member}: {e}")
+            return
+        self._applied[key] = tier
+
+    async def stop(self) -> None:
+        """Cancela los workers; las ediciones pendientes se descartan."""
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._pending.clear()
+
+
+nickname_syncer = NicknameSyncer()
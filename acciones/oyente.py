@@ -70,11 +70,13 @@ def fuzzy_match(user_input: str, session: Session, keywords: list, min_score: in
     # Filtrar las preguntas que contienen las palabras clave, manejando valores nulos
     filtered_df = df[
         df["keyword"].apply(
-            lambda x: any(
-                normalize_text(keyword) in normalize_text(x) for keyword in keywords
-            )
-            if pd.notna(x)
-            else False,
+            lambda x: (
+                any(
+                    normalize_text(keyword) in normalize_text(x) for keyword in keywords
+                )
+                if pd.notna(x)
+                else False
+            ),
             meta=("keyword", "bool"),
         )
     ].compute()
@@ -99,11 +101,13 @@ def fuzzy_suggestions(user_input: str, session: Session, keywords: list, topn: i
     df = get_questions_and_answers(session)
     filtered_df = df[
         df["keyword"].apply(
-            lambda x: any(
-                normalize_text(keyword) in normalize_text(x) for keyword in keywords
-            )
-            if pd.notna(x)
-            else False,
+            lambda x: (
+                any(
+                    normalize_text(keyword) in normalize_text(x) for keyword in keywords
+                )
+                if pd.notna(x)
+                else False
+            ),
             meta=("keyword", "bool"),
         )
     ].compute()
@@ -1,12 +1,14 @@
 # acciones/registrarse.py
 
-from base.database import User, get_db
+from base.database import User, get_user, register_user
+from base.user_cache import CachedUser
 
 
-async def register(discord_id: str, username: str) -> User:
-    db = next(get_db())
-    user = User(discord_id=discord_id, username=username)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+async def register(discord_id: str, username: str) -> User | None:
+    """Registra al usuario; devuelve None si ya estaba registrado."""
+    return await register_user(discord_id, username)
+
+
+async def get_registered(discord_id: str) -> CachedUser | None:
+    """Usuario registrado, leído a través de la caché de usuarios."""
+    return await get_user(discord_id)
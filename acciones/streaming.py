@@ -0,0 +1,155 @@
+"""
+Respuestas de IA que se muestran a medida que llegan.
+
+EmbedStreamer recibe los fragmentos de texto de un stream y los vuelca en
+embeds editando el mensaje, en lugar de esperar la respuesta completa:
+
+- el primer fragmento se muestra apenas llega, reutilizando el mensaje de
+  "pensando";
+- después, cada mensaje se edita como mucho una vez cada `edit_interval`
+  segundos (Discord limita las ediciones a unas 5 cada 5 segundos por canal)
+  y los fragmentos intermedios se acumulan en memoria;
+- al llegar a 4096 caracteres (el máximo de la descripción de un embed) la
+  página se cierra con su texto definitivo y lo que sigue va en un mensaje
+  nuevo, con el siguiente color de la rotación;
+- finish() hace la última edición y agrega timestamp y pie solo en el último
+  embed, como las respuestas sin streaming.
+"""
+
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+import discord
+
+# Máximo de caracteres en la descripción de un embed
+EMBED_DESCRIPTION_LIMIT = 4096
+# Segundos mínimos entre dos ediciones del mismo mensaje
+STREAM_EDIT_INTERVAL = 1.5
+
+
+class EmbedStreamer:
+    """Vuelca un stream de texto en uno o más embeds, editando con throttling."""
+
+    def __init__(
+        self,
+        message: discord.Message,
+        send,
+        next_color: Callable[[], int],
+        *,
+        title: str | None = None,
+        footer_text: str | None = None,
+        footer_icon: str | None = None,
+        tz=timezone.utc,
+        edit_interval: float = STREAM_EDIT_INTERVAL,
+        page_size: int = EMBED_DESCRIPTION_LIMIT,
+    ):
+        """
+        Args:
+            message: Mensaje a reutilizar para la primera página (el de "pensando")
+            send: Corutina que envía un mensaje nuevo, p. ej. ctx.send
+            next_color: Devuelve el color del siguiente embed
+            title: Título del primer embed
+            footer_text: Pie del último embed
+            footer_icon: Ícono del pie
+            tz: Zona horaria del timestamp del último embed
+            edit_interval: Segundos mínimos entre ediciones de un mensaje
+            page_size: Caracteres por embed
+        """
+        self._message: discord.Message | None = message
+        # Mensaje de la página anterior, por si la última queda en blanco
+        self._previous_message: discord.Message | None = None
+        self._send = send
+        self._next_color = next_color
+        self.title = title
+        self.footer_text = footer_text
+        self.footer_icon = footer_icon
+        self.tz = tz
+        self.edit_interval = edit_interval
+        self.page_size = page_size
+        self._pages: list[str] = [""]
+        self._colors: list[int] = [next_color()]
+        self._shown = 0  # caracteres de la página actual ya visibles en Discord
+        self._last_edit = 0.0
+        self.edits = 0
+        self.first_visible_at: float | None = None  # time.monotonic()
+
+    @property
+    def started(self) -> bool:
+        """True si ya se mostró algo de la respuesta."""
+        return self.first_visible_at is not None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._pages)
+
+    def _embed(self, index: int, final: bool = False, note: str | None = None):
+        embed = discord.Embed(
+            title=self.title if index == 0 else None,
+            description=self._pages[index],
+            color=self._colors[index],
+            timestamp=datetime.now(self.tz) if final else None,
+        )
+        if final and (self.footer_text or note):
+            footer = " · ".join(filter(None, (note, self.footer_text)))
+            embed.set_footer(text=footer, icon_url=self.footer_icon)
+        return embed
+
+    async def _show(self, final: bool = False, note: str | None = None) -> None:
+        """Muestra la página actual: edita su mensaje o lo envía si es nueva."""
+        index = len(self._pages) - 1
+        embed = self._embed(index, final=final, note=note)
+        if self._message is None:
+            self._message = await self._send(embed=embed)
+        else:
+            await self._message.edit(content=None, embed=embed)
+        self.edits += 1
+        self._shown = len(self._pages[index])
+        self._last_edit = time.monotonic()
+        if self.first_visible_at is None:
+            self.first_visible_at = self._last_edit
+
+    async def _close_page(self) -> None:
+        """Deja la página llena con su texto definitivo y abre una nueva."""
+        if self._shown < len(self._pages[-1]):
+            await self._show()
+        self._pages.append("")
+        self._colors.append(self._next_color())
+        self._previous_message = self._message
+        self._message = None
+        self._shown = 0
+
+    async def push(self, delta: str) -> None:
+        """Agrega un fragmento; edita solo si pasó el intervalo mínimo."""
+        while delta:
+            room = self.page_size - len(self._pages[-1])
+            if room <= 0:
+                await self._close_page()
+                continue
+            self._pages[-1] += delta[:room]
+            delta = delta[room:]
+        if not self._pages[-1].strip():
+            return
+        if not self.started or time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._show()
+
+    async def finish(self, note: str | None = None) -> str:
+        """
+        Hace la última edición, con timestamp y pie.
+
+        Args:
+            note: Aviso para el pie, p. ej. si la respuesta se cortó
+
+        Returns:
+            str: Texto completo recibido
+        """
+        text = self.text
+        if not self._pages[-1].strip() and len(self._pages) > 1:
+            # La respuesta llenó una página y terminó en espacios: la página
+            # en blanco no se envía y se cierra la anterior, que ya es visible
+            self._pages.pop()
+            self._colors.pop()
+            self._message = self._previous_message
+        if self._pages[-1].strip():
+            await self._show(final=True, note=note)
+        return text
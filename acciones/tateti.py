@@ -4,7 +4,7 @@ import discord
 from discord import ButtonStyle
 from discord.ui import Button, Select, View
 
-from base.database import TatetiWinner, get_db
+from base.database import record_tateti_win
 
 
 class Tateti(View):
@@ -144,15 +144,10 @@ class Tateti(View):
         return False
 
     async def registrar_ganador(self, user):
-        db = next(get_db())
         try:
-            nuevo_ganador = TatetiWinner(discord_id=user.id, username=user.name)
-            db.add(nuevo_ganador)
-            db.commit()
+            await record_tateti_win(user.id, user.name)
         except Exception as e:
             print(f"Error al registrar el ganador: {e}")
-        finally:
-            db.close()
 
 
 class TatetiSetup(View):
@@ -1,7 +1,10 @@
-# Este script se encarga de crear las tablas de la base de datos y de insertar datos iniciales en la tabla FAQ.
-# También valida los datos antes de insertarlos y muestra un mensaje de error si los datos son inválidos.
-# Para ejecutar este script, debes tener la base de datos creada y configurada en el archivo .env.
+# Modelos, motores y helpers de acceso a la base de datos.
+# Importar este módulo no toca la base de datos: la creación de tablas y la carga
+# de datos iniciales se hacen explícitamente con `python -m base.manage init`.
+# La URL de la base de datos se configura en el archivo .env; sin DATABASE_URL se
+# usa un archivo SQLite local (SQLITE_PATH) en modo WAL.
 import os
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta
 
 import pytz
@@ -17,10 +20,40 @@ from sqlalchemy import (
     String,
     Text,
     create_engine,
+    delete,
+    event,
     func,
+    insert,
+    inspect,
+    make_url,
+    select,
+    text,
+    update,
 )
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+from base.leaderboard import tateti_leaderboard, thanks_leaderboard
+from base.pool_monitor import PoolMonitor
+from base.query_stats import attach as attach_query_stats
+from base.query_stats import db_helper
+from base.user_cache import user_cache
+from config.db_config import (
+    DB_CONNECTION_LEAK_SECONDS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_DEBUG,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_PATH,
+    SQLITE_SYNCHRONOUS,
+)
 
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv()
@@ -28,6 +61,11 @@ load_dotenv()
 Base = declarative_base()
 
 
+def utcnow():
+    """Fecha y hora actual en UTC sin tzinfo (las columnas son TIMESTAMP sin zona)."""
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -35,13 +73,37 @@ class User(Base):
     username = Column(String, nullable=False)
     thanks_count = Column(Integer, default=0)  # Nueva columna para contar "gracias"
 
+    # Índice para el >ranking de agradecimientos (ORDER BY thanks_count DESC)
+    __table_args__ = (Index("ix_users_thanks_count", "thanks_count"),)
+
 
 class TatetiWinner(Base):
     __tablename__ = "tateti_winners"
     id = Column(Integer, primary_key=True)
     discord_id = Column(String, nullable=False)
     username = Column(String, nullable=False)
-    win_date = Column(DateTime, default=lambda: datetime.now(pytz.utc))
+    win_date = Column(DateTime, default=utcnow)
+
+    # Índice para >tateti_ganadores (últimos ganadores por fecha)
+    __table_args__ = (Index("ix_tateti_winners_win_date", "win_date"),)
+
+
+class TatetiWinCount(Base):
+    """
+    Resumen materializado de victorias de tateti por usuario.
+
+    Se actualiza en la misma transacción que cada victoria (record_tateti_win),
+    de modo que el ranking lee K filas por índice en vez de agrupar todo el
+    historial de tateti_winners. `python -m base.manage migrate` lo reconstruye.
+    """
+
+    __tablename__ = "tateti_win_counts"
+    discord_id = Column(String, primary_key=True)
+    username = Column(String, nullable=False)
+    wins = Column(Integer, nullable=False, default=0)
+    last_win = Column(DateTime, default=utcnow)
+
+    __table_args__ = (Index("ix_tateti_win_counts_wins", "wins", "last_win"),)
 
 
 class FAQ(Base):
@@ -55,6 +117,17 @@ class FAQ(Base):
     __table_args__ = (Index("ix_faq_question", "question"),)
 
 
+# Columnas de contadores de LlamaMetrics (todas se acumulan sumando deltas)
+LLAMA_METRIC_FIELDS = (
+    "llama_uses",
+    "tokens_used",
+    "total_response_time",
+    "api_failures",
+    "total_first_token_ms",
+    "first_token_count",
+)
+
+
 # Modelo para métricas por día y usuario
 class LlamaMetrics(Base):
     __tablename__ = "llama_metrics"
@@ -63,8 +136,54 @@ class LlamaMetrics(Base):
     llama_uses = Column(Integer, default=0)
     tokens_used = Column(Integer, default=0)
     total_response_time = Column(Integer, default=0)  # en segundos
-    responses_as_file = Column(Integer, default=0)
     api_failures = Column(Integer, default=0)
+    # Tiempo hasta el primer token en streaming: suma en ms y cantidad de muestras
+    total_first_token_ms = Column(Integer, default=0, server_default="0")
+    first_token_count = Column(Integer, default=0, server_default="0")
+
+
+# Clave user_id de las filas de rollup que suman a todos los usuarios
+LLAMA_ROLLUP_ALL_USERS = "*"
+
+
+class LlamaMetricsRollup(Base):
+    """
+    Totales de LlamaMetrics por día, semana (lunes) y mes, por usuario y globales.
+
+    Los mantiene el job diario de base/llama_rollups.py. La clave primaria
+    (period, user_id, period_start) hace que un rango de fechas de un usuario
+    sea un único recorrido contiguo del índice.
+    """
+
+    __tablename__ = "llama_metrics_rollups"
+    period = Column(String, primary_key=True)  # 'day' | 'week' | 'month'
+    user_id = Column(String, primary_key=True)  # LLAMA_ROLLUP_ALL_USERS = global
+    period_start = Column(Date, primary_key=True)
+    llama_uses = Column(Integer, default=0)
+    tokens_used = Column(Integer, default=0)
+    total_response_time = Column(Integer, default=0)  # en segundos
+    api_failures = Column(Integer, default=0)
+    # Tiempo hasta el primer token en streaming: suma en ms y cantidad de muestras
+    total_first_token_ms = Column(Integer, default=0, server_default="0")
+    first_token_count = Column(Integer, default=0, server_default="0")
+
+
+class LlamaResponseCache(Base):
+    """
+    Copia persistente de la caché de respuestas de >llama.
+
+    La clave es el hash de (modelo, temperatura, pregunta normalizada); ver
+    base/response_cache.py. Solo se lee al arrancar, para sembrar la caché
+    en memoria. Cada escritura poda las filas vencidas y las que exceden el
+    tamaño de la caché, así que la tabla no crece más que la caché.
+    """
+
+    __tablename__ = "llama_response_cache"
+    key = Column(String(64), primary_key=True)
+    question = Column(Text, nullable=False)
+    response = Column(Text, nullable=False)
+    tokens = Column(Integer, default=0)  # tokens que costó generarla
+    created_at = Column(DateTime, default=utcnow, index=True)
 
 
 # Modelo para sesiones de chat de Gemini
@@ -72,11 +191,11 @@ class GeminiChatSession(Base):
     __tablename__ = "gemini_chat_sessions"
     id = Column(Integer, primary_key=True)
     discord_user_id = Column(String, nullable=False, index=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(pytz.utc))
+    created_at = Column(DateTime, default=utcnow)
     last_updated = Column(
         DateTime,
-        default=lambda: datetime.now(pytz.utc),
-        onupdate=lambda: datetime.now(pytz.utc),
+        default=utcnow,
+        onupdate=utcnow,
     )
     is_active = Column(Boolean, default=True)
 
@@ -93,11 +212,16 @@ class GeminiChatMessage(Base):
     session_id = Column(Integer, ForeignKey("gemini_chat_sessions.id"), nullable=False)
     role = Column(String, nullable=False)  # 'user' o 'model'
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=lambda: datetime.now(pytz.utc))
+    timestamp = Column(DateTime, default=utcnow)
 
     # Relación con la sesión
     session = relationship("GeminiChatSession", back_populates="messages")
 
+    # Índice compuesto para leer la cola de una conversación sin ordenar la tabla
+    __table_args__ = (
+        Index("ix_gemini_chat_messages_session_ts", "session_id", "timestamp", "id"),
+    )
+
 
 # Modelo para historial de chat de Gemini
 class GeminiChatHistory(Base):
@@ -108,7 +232,7 @@ class GeminiChatHistory(Base):
         Integer, ForeignKey("gemini_chat_sessions.id"), nullable=False
     )
     message_id = Column(Integer, ForeignKey("gemini_chat_messages.id"), nullable=False)
-    timestamp = Column(DateTime, default=lambda: datetime.now(pytz.utc))
+    timestamp = Column(DateTime, default=utcnow)
 
     # Relación con la sesión de chat
     chat_session = relationship("GeminiChatSession", backref="chat_history")
@@ -117,169 +241,669 @@ class GeminiChatHistory(Base):
     chat_message = relationship("GeminiChatMessage", backref="chat_history")
 
 
-# Obtener la URL de la base de datos desde la variable de entorno
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Obtener la URL de la base de datos desde la variable de entorno; sin ella se usa
+# SQLite embebido (desarrollo, benchmarks y despliegues chicos de un solo nodo)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{SQLITE_PATH}"
+
+
+def _to_async_url(url):
+    """
+    Convierte una URL síncrona de SQLAlchemy en su equivalente con driver async.
+
+    postgresql:// usa asyncpg y sqlite:// usa aiosqlite, de modo que la misma
+    variable DATABASE_URL sirve para ambos motores.
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    async_driver = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}.get(backend)
+    if async_driver is None:
+        return url
+    return url.set(drivername=f"{backend}+{async_driver}")
+
+
+# Se puede forzar una URL async distinta con ASYNC_DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+
+def _is_sqlite_memory(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def _sqlite_engine_options(url) -> dict:
+    """
+    Pool para SQLite: una conexión por hilo en el motor síncrono y una única
+    conexión compartida para bases en memoria (cada conexión nueva vería una
+    base vacía). El motor aiosqlite conserva su pool por defecto.
+
+    Nota: con `sqlite://` en memoria los motores sync y async apuntan a bases
+    distintas; para compartir datos entre ambos usar un archivo.
+    """
+    if _is_sqlite_memory(url):
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    if url.get_driver_name() == "aiosqlite":
+        return {}
+    return {"poolclass": SingletonThreadPool}
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL y pragmas recomendados, aplicados a cada conexión SQLite nueva."""
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL permite lecturas concurrentes con una escritura; no aplica en memoria
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def _engine_options(url) -> dict:
+    """
+    Opciones de pool y de conexión para create_engine / create_async_engine.
 
-engine = create_engine(DATABASE_URL)
+    En Postgres se aplican el tamaño del pool, el reciclado, el pre-ping y el
+    statement_timeout del servidor (vía `options` en psycopg y `server_settings`
+    en asyncpg). Otros backends conservan los valores por defecto de SQLAlchemy.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return _sqlite_engine_options(url)
+    if url.get_backend_name() != "postgresql":
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            }
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+            }
+    return options
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor async: lo usan los cogs para no bloquear el event loop de Discord
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL)
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _sqlite_pragmas)
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+# Medición de latencia por consulta en ambos motores (ver >db_stats)
+attach_query_stats(engine)
+attach_query_stats(async_engine.sync_engine)
+
+# Métricas de checkout/checkin y detección de conexiones retenidas (ver >db_pool)
+sync_pool_monitor = PoolMonitor("sync", DB_CONNECTION_LEAK_SECONDS, DB_POOL_DEBUG)
+async_pool_monitor = PoolMonitor("async", DB_CONNECTION_LEAK_SECONDS, DB_POOL_DEBUG)
+sync_pool_monitor.attach(engine)
+async_pool_monitor.attach(async_engine.sync_engine)
+
+
+@asynccontextmanager
+async def session_scope():
+    """
+    Sesión async de vida acotada: commit al salir, rollback si hay una excepción.
+
+    Es la única forma de abrir sesiones en el bot; garantiza que la conexión
+    vuelva al pool aunque el comando falle.
+
+        async with session_scope() as db:
+            ...
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+
+
+@contextmanager
+def sync_session_scope():
+    """Equivalente síncrono de session_scope (comandos de manage y búsquedas de FAQ)."""
+    with SessionLocal() as db:
+        try:
+            yield db
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+
 
 def get_db():
-    db = SessionLocal()
-    try:
+    with sync_session_scope() as db:
         yield db
-    finally:
-        db.close()
-
-
-def get_or_create_today_metrics(db, user_id):
-    today = datetime.now(pytz.timezone("America/Montevideo")).date()
-    metrics = db.query(LlamaMetrics).filter_by(date=today, user_id=user_id).first()
-    if not metrics:
-        metrics = LlamaMetrics(date=today, user_id=user_id)
-        db.add(metrics)
-        db.commit()
-        db.refresh(metrics)
-    return metrics
-
-
-def increment_llama_metric(user_id, field, amount=1):
-    db = next(get_db())
-    metrics = get_or_create_today_metrics(db, user_id)
-    setattr(metrics, field, getattr(metrics, field) + amount)
-    db.commit()
-    db.close()
-
-
-def add_response_time(user_id, seconds):
-    db = next(get_db())
-    metrics = get_or_create_today_metrics(db, user_id)
-    metrics.total_response_time += int(seconds)
-    db.commit()
-    db.close()
-
-
-def get_user_metrics(user_id):
-    db = next(get_db())
-    today = datetime.now(pytz.timezone("America/Montevideo")).date()
-    metrics = db.query(LlamaMetrics).filter_by(date=today, user_id=user_id).first()
-    db.close()
-    return metrics
-
-
-def get_global_metrics():
-    db = next(get_db())
-    today = datetime.now(pytz.timezone("America/Montevideo")).date()
-    result = (
-        db.query(
-            func.sum(LlamaMetrics.llama_uses),
-            func.sum(LlamaMetrics.tokens_used),
-            func.sum(LlamaMetrics.total_response_time),
-            func.sum(LlamaMetrics.responses_as_file),
-            func.sum(LlamaMetrics.api_failures),
-        )
-        .filter_by(date=today)
-        .first()
+
+
+def today_uy():
+    return datetime.now(pytz.timezone("America/Montevideo")).date()
+
+
+# INSERT con soporte de ON CONFLICT según el dialecto del motor async
+_DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def dialect_insert(table):
+    dialect = async_engine.dialect.name
+    if dialect not in _DIALECT_INSERTS:
+        raise NotImplementedError(f"Dialecto no soportado para upserts: {dialect}")
+    return _DIALECT_INSERTS[dialect](table)
+
+
+def _llama_metrics_upsert(fields):
+    """
+    INSERT ... ON CONFLICT (date, user_id) DO UPDATE SET campo = campo + delta.
+    """
+    stmt = dialect_insert(LlamaMetrics)
+    set_ = {
+        field: func.coalesce(getattr(LlamaMetrics, field), 0)
+        + getattr(stmt.excluded, field)
+        for field in fields
+    }
+    return stmt.on_conflict_do_update(
+        index_elements=[LlamaMetrics.date, LlamaMetrics.user_id], set_=set_
     )
-    db.close()
-    return result
 
 
-# Funciones para manejar sesiones de chat de Gemini
-def get_or_create_gemini_session(discord_user_id):
+@db_helper
+async def upsert_llama_metrics_batch(rows):
     """
-    Obtiene la sesión de chat activa de Gemini para un usuario o crea una nueva si no existe.
+    Suma deltas de métricas en lote con un único INSERT ... ON CONFLICT DO UPDATE.
 
     Args:
-        discord_user_id (str): ID del usuario de Discord
+        rows (list[dict]): Filas con date, user_id y un delta por cada campo de
+            LLAMA_METRIC_FIELDS. Cada (date, user_id) debe aparecer una sola vez.
+    """
+    if not rows:
+        return
+    async with session_scope() as db:
+        await db.execute(_llama_metrics_upsert(LLAMA_METRIC_FIELDS), rows)
 
-    Returns:
-        GeminiChatSession: Sesión de chat de Gemini
+
+@db_helper
+async def get_user_metrics(user_id):
+    async with session_scope() as db:
+        result = await db.execute(
+            select(LlamaMetrics).filter_by(date=today_uy(), user_id=user_id)
+        )
+        return result.scalars().first()
+
+
+@db_helper
+async def get_today_tokens_by_user():
+    """Tokens consumidos hoy por cada usuario: lista de (user_id, tokens_used)."""
+    async with session_scope() as db:
+        result = await db.execute(
+            select(LlamaMetrics.user_id, LlamaMetrics.tokens_used).filter(
+                LlamaMetrics.date == today_uy(), LlamaMetrics.tokens_used > 0
+            )
+        )
+        return result.all()
+
+
+@db_helper
+async def get_global_metrics():
+    async with session_scope() as db:
+        result = await db.execute(
+            select(
+                *(func.sum(getattr(LlamaMetrics, f)) for f in LLAMA_METRIC_FIELDS)
+            ).filter_by(date=today_uy())
+        )
+        return result.first()
+
+
+async def _prune_llama_response_cache(db, max_rows, max_age_seconds):
     """
-    db = next(get_db())
+    Borra las respuestas vencidas y las que quedan fuera de las `max_rows` más
+    nuevas. Ambos borrados usan el índice de created_at.
+    """
+    R = LlamaResponseCache
+    cutoff = utcnow() - timedelta(seconds=max_age_seconds)
+    # created_at de la primera fila que sobra, si la tabla excede max_rows
+    oldest_kept = await db.scalar(
+        select(R.created_at)
+        .order_by(R.created_at.desc())
+        .offset(max(int(max_rows), 0))
+        .limit(1)
+    )
+    if oldest_kept is not None:
+        cutoff = max(cutoff, oldest_kept + timedelta(microseconds=1))
+    await db.execute(delete(R).where(R.created_at < cutoff))
 
-    try:
-        # Buscar una sesión activa existente
-        session = (
-            db.query(GeminiChatSession)
-            .filter_by(discord_user_id=str(discord_user_id), is_active=True)
-            .first()
+
+@db_helper
+async def load_llama_response_cache(limit, max_age_seconds):
+    """
+    Poda la tabla y devuelve las `limit` respuestas más nuevas.
+
+    Returns:
+        list: Filas (key, question, response, tokens, created_at), de la más
+            nueva a la más vieja
+    """
+    async with session_scope() as db:
+        await _prune_llama_response_cache(db, limit, max_age_seconds)
+        result = await db.execute(
+            select(
+                LlamaResponseCache.key,
+                LlamaResponseCache.question,
+                LlamaResponseCache.response,
+                LlamaResponseCache.tokens,
+                LlamaResponseCache.created_at,
+            )
+            .order_by(LlamaResponseCache.created_at.desc())
+            .limit(limit)
         )
+        return result.all()
 
-        # Si no existe, crear una nueva
-        if not session:
-            session = GeminiChatSession(discord_user_id=str(discord_user_id))
-            db.add(session)
-            db.commit()
-            db.refresh(session)
 
-        return session
-    finally:
-        db.close()
+@db_helper
+async def save_llama_response(
+    key, question, response, tokens, created_at, max_rows, max_age_seconds
+):
+    """
+    Guarda (o reemplaza) una respuesta de la caché de >llama y poda la tabla
+    a `max_rows` filas no vencidas, en la misma transacción.
+    """
+    stmt = dialect_insert(LlamaResponseCache).values(
+        key=key,
+        question=question,
+        response=response,
+        tokens=int(tokens),
+        created_at=created_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={
+            "question": stmt.excluded.question,
+            "response": stmt.excluded.response,
+            "tokens": stmt.excluded.tokens,
+            "created_at": stmt.excluded.created_at,
+        },
+    )
+    async with session_scope() as db:
+        await db.execute(stmt)
+        await _prune_llama_response_cache(db, max_rows, max_age_seconds)
 
 
-def add_message_to_session(session_id, role, content):
+def _user_insert_ignore(target=User):
     """
-    Añade un mensaje a una sesión de chat de Gemini.
+    INSERT INTO users ... ON CONFLICT (discord_id) DO NOTHING.
 
-    Args:
-        session_id (int): ID de la sesión de chat
-        role (str): Rol del mensaje ('user' o 'model')
-        content (str): Contenido del mensaje
+    Con `User.__table__` la sentencia es Core y su resultado informa rowcount,
+    que el INSERT en lote del ORM no expone.
+    """
+    return dialect_insert(target).on_conflict_do_nothing(index_elements=["discord_id"])
+
+
+@db_helper
+async def get_user(discord_id):
+    """
+    Lectura de un usuario a través de la caché (read-through).
+
+    Returns:
+        CachedUser | None: Copia de la fila, o None si el usuario no existe
+    """
+    cached = user_cache.get(discord_id)
+    if cached is not None:
+        return cached
+    async with session_scope() as db:
+        user = await db.scalar(select(User).filter_by(discord_id=str(discord_id)))
+    return user_cache.put(user) if user is not None else None
+
+
+@db_helper
+async def register_user(discord_id, username):
+    """
+    Registra un usuario con un único INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Primero lo busca con get_user: si ya está en la caché no se toca la BD, y
+    si existe en la BD queda en la caché para el próximo intento.
 
     Returns:
-        GeminiChatMessage: Mensaje añadido
+        User | None: El usuario creado, o None si ya estaba registrado
     """
-    db = next(get_db())
+    if await get_user(discord_id) is not None:
+        return None
+    stmt = _user_insert_ignore().values(
+        discord_id=str(discord_id), username=username, thanks_count=0
+    )
+    async with session_scope() as db:
+        if async_engine.dialect.insert_returning:
+            user = await db.scalar(stmt.returning(User))
+        else:
+            # SQLite < 3.35 no soporta RETURNING: insertar y leer solo si se creó
+            result = await db.execute(stmt)
+            user = None
+            if result.rowcount:
+                user = await db.scalar(
+                    select(User).filter_by(discord_id=str(discord_id))
+                )
+    if user is not None:
+        user_cache.put(user)
+    return user
+
+
+@db_helper
+async def increment_thanks(discord_id, username):
+    """
+    Suma un agradecimiento de forma atómica y devuelve el nuevo total.
+
+    Una sola sentencia: INSERT ... ON CONFLICT (discord_id) DO UPDATE SET
+    thanks_count = thanks_count + 1 RETURNING. Crea al usuario si no existía y,
+    al no leer y escribir por separado, dos >gracias simultáneos no pierden
+    ninguna suma. El total se escribe en la caché de usuarios (write-through);
+    si la sentencia falla, la copia en caché se invalida porque ya no se sabe
+    si el incremento llegó a la base.
 
+    Returns:
+        int: thanks_count después del incremento
+    """
+    stmt = dialect_insert(User.__table__).values(
+        discord_id=str(discord_id), username=username, thanks_count=1
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["discord_id"],
+        set_={"thanks_count": func.coalesce(User.__table__.c.thanks_count, 0) + 1},
+    )
+    columns = (User.discord_id, User.username, User.thanks_count)
     try:
-        # Actualizar timestamp de la sesión
-        session = db.query(GeminiChatSession).filter_by(id=session_id).first()
-        if not session:
-            return None
+        async with session_scope() as db:
+            if async_engine.dialect.insert_returning:
+                row = (await db.execute(stmt.returning(*columns))).one()
+            else:
+                # SQLite < 3.35 no soporta RETURNING: leer dentro de la misma transacción
+                await db.execute(stmt)
+                row = (
+                    await db.execute(
+                        select(*columns).filter_by(discord_id=str(discord_id))
+                    )
+                ).one()
+    except Exception:
+        user_cache.invalidate(discord_id)
+        raise
+    thanks_leaderboard.update(row.discord_id, row.username, row.thanks_count)
+    return user_cache.put_increment(row).thanks_count
 
-        session.last_updated = datetime.now(pytz.utc)
 
-        # Añadir el mensaje
-        message = GeminiChatMessage(session_id=session_id, role=role, content=content)
+@db_helper
+async def get_thanks_ranking(limit=10):
+    """
+    Usuarios con más agradecimientos, leídos de la base (usa ix_users_thanks_count).
 
-        db.add(message)
-        db.commit()
-        db.refresh(message)
+    Las filas leídas precalientan la caché de usuarios. >ranking lee
+    thanks_leaderboard; esta consulta lo carga y lo reconcilia.
 
-        return message
-    finally:
-        db.close()
+    Returns:
+        list[Row]: (discord_id, username, thanks_count) por thanks_count descendente
+    """
+    async with session_scope() as db:
+        result = await db.execute(
+            select(User.discord_id, User.username, User.thanks_count)
+            # Filas viejas pueden tener thanks_count NULL: que no ocupen el top
+            .order_by(func.coalesce(User.thanks_count, 0).desc())
+            .limit(limit)
+        )
+        rows = result.all()
+    for row in rows:
+        user_cache.put(row)
+    return rows
 
 
-def get_session_messages(session_id, limit=20):
+@db_helper
+async def register_users_bulk(members, batch_size=500):
     """
-    Obtiene los últimos mensajes de una sesión de chat de Gemini.
+    Registra muchos usuarios a la vez, ignorando los que ya existen.
+
+    Cada lote es un único INSERT ... ON CONFLICT DO NOTHING ejecutado como
+    executemany en su propia transacción corta.
 
     Args:
-        session_id (int): ID de la sesión de chat
-        limit (int): Número máximo de mensajes a obtener
+        members (Iterable[tuple[str, str]]): Pares (discord_id, username)
+        batch_size (int): Filas por lote
 
     Returns:
-        list: Lista de mensajes
+        int: Usuarios nuevos insertados (aproximado si el driver no informa
+            rowcount en executemany)
+    """
+    rows = [
+        {"discord_id": str(discord_id), "username": username, "thanks_count": 0}
+        for discord_id, username in members
+    ]
+    inserted = 0
+    for start in range(0, len(rows), batch_size):
+        async with session_scope() as db:
+            result = await db.execute(
+                _user_insert_ignore(User.__table__), rows[start : start + batch_size]
+            )
+        inserted += max(result.rowcount or 0, 0)
+    return inserted
+
+
+@db_helper
+async def record_tateti_win(discord_id, username):
     """
-    db = next(get_db())
+    Registra una victoria de tateti y suma uno al resumen del ganador.
 
-    try:
-        messages = (
-            db.query(GeminiChatMessage)
-            .filter_by(session_id=session_id)
-            .order_by(GeminiChatMessage.timestamp)
+    Ambas escrituras van en una transacción: el historial en tateti_winners y
+    un INSERT ... ON CONFLICT DO UPDATE sobre tateti_win_counts, cuyo total
+    actualiza el ranking en memoria.
+
+    Returns:
+        int: Victorias acumuladas del ganador
+    """
+    now = utcnow()
+    stmt = dialect_insert(TatetiWinCount).values(
+        discord_id=str(discord_id), username=username, wins=1, last_win=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TatetiWinCount.discord_id],
+        set_={
+            "wins": TatetiWinCount.wins + 1,
+            "username": stmt.excluded.username,
+            "last_win": stmt.excluded.last_win,
+        },
+    )
+    columns = (TatetiWinCount.username, TatetiWinCount.wins, TatetiWinCount.last_win)
+    async with session_scope() as db:
+        db.add(
+            TatetiWinner(discord_id=str(discord_id), username=username, win_date=now)
+        )
+        if async_engine.dialect.insert_returning:
+            row = (await db.execute(stmt.returning(*columns))).one()
+        else:
+            await db.execute(stmt)
+            row = (
+                await db.execute(select(*columns).filter_by(discord_id=str(discord_id)))
+            ).one()
+    tateti_leaderboard.update(discord_id, row.username, row.wins, row.last_win)
+    return row.wins
+
+
+@db_helper
+async def get_tateti_ranking(limit=10):
+    """
+    Usuarios con más victorias de tateti, leídos del resumen materializado.
+
+    >tateti_ranking lee tateti_leaderboard; esta consulta lo carga y lo reconcilia.
+
+    Returns:
+        list: Filas (discord_id, username, wins, last_win) ordenadas por
+            victorias; a igual cantidad, primero quien llegó antes
+    """
+    async with session_scope() as db:
+        result = await db.execute(
+            select(
+                TatetiWinCount.discord_id,
+                TatetiWinCount.username,
+                TatetiWinCount.wins,
+                TatetiWinCount.last_win,
+            )
+            .order_by(TatetiWinCount.wins.desc(), TatetiWinCount.last_win)
+            .limit(limit)
+        )
+        return result.all()
+
+
+@db_helper
+async def get_recent_tateti_winners(limit=10):
+    """Últimas victorias de tateti: lista de (username, discord_id, win_date)."""
+    async with session_scope() as db:
+        result = await db.execute(
+            select(
+                TatetiWinner.username, TatetiWinner.discord_id, TatetiWinner.win_date
+            )
+            .order_by(TatetiWinner.win_date.desc())
             .limit(limit)
-            .all()
         )
+        return result.all()
 
-        return messages
-    finally:
-        db.close()
+
+@db_helper
+def rebuild_tateti_win_counts(session):
+    """
+    Reconstruye tateti_win_counts agrupando todo tateti_winners.
+
+    Lo usa `manage migrate` al crear la tabla (backfill de victorias anteriores
+    al resumen) y `manage rebuild` para corregirlo si alguna vez se desincroniza. Conserva el último nombre de
+    usuario con el que ganó cada jugador.
+    """
+    latest = (
+        select(TatetiWinner.username)
+        .where(TatetiWinner.discord_id == TatetiWinCount.discord_id)
+        .order_by(TatetiWinner.win_date.desc(), TatetiWinner.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    session.execute(delete(TatetiWinCount))
+    session.execute(
+        insert(TatetiWinCount).from_select(
+            ["discord_id", "username", "wins", "last_win"],
+            select(
+                TatetiWinner.discord_id,
+                func.max(TatetiWinner.username),
+                func.count(),
+                func.max(TatetiWinner.win_date),
+            ).group_by(TatetiWinner.discord_id),
+        )
+    )
+    session.execute(update(TatetiWinCount).values(username=latest))
+    return session.scalar(select(func.count()).select_from(TatetiWinCount))
+
+
+# Funciones para manejar sesiones de chat de Gemini
+@db_helper
+async def append_exchange(discord_user_id, user_text, model_text):
+    """
+    Guarda un intercambio completo (pregunta y respuesta) en una sola transacción.
+
+    Resuelve o crea la sesión activa del usuario, inserta ambos mensajes con un
+    único executemany y actualiza last_updated, con un solo commit.
+
+    Args:
+        discord_user_id (str): ID del usuario de Discord
+        user_text (str): Mensaje enviado por el usuario
+        model_text (str): Respuesta del modelo
+
+    Returns:
+        int: ID de la sesión donde se guardó el intercambio
+    """
+    now = utcnow()
+    async with session_scope() as db:
+        session_id = await db.scalar(
+            select(GeminiChatSession.id)
+            .filter_by(discord_user_id=str(discord_user_id), is_active=True)
+            .limit(1)
+        )
+        if session_id is None:
+            session = GeminiChatSession(
+                discord_user_id=str(discord_user_id), created_at=now, last_updated=now
+            )
+            db.add(session)
+            await db.flush()
+            session_id = session.id
+        else:
+            await db.execute(
+                update(GeminiChatSession)
+                .where(GeminiChatSession.id == session_id)
+                .values(last_updated=now)
+            )
+
+        await db.execute(
+            insert(GeminiChatMessage),
+            [
+                {
+                    "session_id": session_id,
+                    "role": "user",
+                    "content": user_text,
+                    "timestamp": now,
+                },
+                {
+                    "session_id": session_id,
+                    "role": "model",
+                    "content": model_text,
+                    "timestamp": now,
+                },
+            ],
+        )
+        return session_id
+
+
+@db_helper
+async def get_recent_history(discord_user_id, limit=20):
+    """
+    Obtiene los últimos mensajes de la sesión activa de un usuario en una sola consulta.
+
+    Une sesión y mensajes para que hidratar el historial cueste un único
+    round-trip. Si el usuario no tiene sesión activa devuelve una lista vacía;
+    append_exchange la creará al guardar el primer intercambio.
+
+    Args:
+        discord_user_id (str): ID del usuario de Discord
+        limit (int): Número máximo de mensajes a obtener
+
+    Returns:
+        list: Tuplas (role, content), del mensaje más antiguo al más reciente
+    """
+    stmt = (
+        select(GeminiChatMessage.role, GeminiChatMessage.content)
+        .join(GeminiChatSession, GeminiChatMessage.session_id == GeminiChatSession.id)
+        .where(
+            GeminiChatSession.discord_user_id == str(discord_user_id),
+            GeminiChatSession.is_active,
+        )
+        .order_by(GeminiChatMessage.timestamp.desc(), GeminiChatMessage.id.desc())
+        .limit(limit)
+    )
+    async with session_scope() as db:
+        result = await db.execute(stmt)
+        rows = [tuple(row) for row in result.all()]
+    rows.reverse()
+    return rows
 
 
-def reset_gemini_session(discord_user_id):
+@db_helper
+async def reset_gemini_session(discord_user_id):
     """
     Desactiva todas las sesiones anteriores y crea una nueva para el usuario.
 
@@ -289,139 +913,93 @@ def reset_gemini_session(discord_user_id):
     Returns:
         GeminiChatSession: Nueva sesión de chat
     """
-    db = next(get_db())
-
-    try:
+    async with session_scope() as db:
         # Desactivar todas las sesiones existentes
-        db.query(GeminiChatSession).filter_by(
-            discord_user_id=str(discord_user_id)
-        ).update({GeminiChatSession.is_active: False})
+        await db.execute(
+            update(GeminiChatSession)
+            .filter_by(discord_user_id=str(discord_user_id))
+            # Conservar last_updated: el onupdate lo pisaría y la retención
+            # vería la sesión como recién usada
+            .values(is_active=False, last_updated=GeminiChatSession.last_updated)
+        )
 
         # Crear nueva sesión
         new_session = GeminiChatSession(discord_user_id=str(discord_user_id))
         db.add(new_session)
-        db.commit()
-        db.refresh(new_session)
+        await db.commit()
+        await db.refresh(new_session)
 
         return new_session
-    finally:
-        db.close()
 
 
-def prune_old_sessions(days_inactive=30):
+@db_helper
+async def prune_old_sessions(days_inactive=30):
     """
     Marca como inactivas las sesiones que no han sido actualizadas en un tiempo determinado.
 
     Args:
         days_inactive (int): Número de días de inactividad para marcar como inactiva
     """
-    db = next(get_db())
+    async with session_scope() as db:
+        cutoff_date = utcnow() - timedelta(days=days_inactive)
+
+        await db.execute(
+            update(GeminiChatSession)
+            .where(
+                GeminiChatSession.last_updated < cutoff_date,
+                GeminiChatSession.is_active,
+            )
+            # Conservar last_updated: el onupdate lo pisaría y la retención
+            # vería la sesión como recién usada
+            .values(is_active=False, last_updated=GeminiChatSession.last_updated)
+        )
 
-    try:
-        cutoff_date = datetime.now(pytz.utc) - timedelta(days=days_inactive)
 
-        db.query(GeminiChatSession).filter(
-            GeminiChatSession.last_updated < cutoff_date, GeminiChatSession.is_active
-        ).update({GeminiChatSession.is_active: False})
+def _add_missing_columns() -> list[str]:
+    """
+    Agrega a las tablas existentes las columnas nuevas del modelo.
 
-        db.commit()
-    finally:
-        db.close()
+    create_all no altera tablas ya creadas. Las columnas nuevas deben admitir
+    NULL o tener server_default, para que las filas existentes queden válidas.
+
+    Returns:
+        list[str]: Columnas agregadas, como "tabla.columna"
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                )
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    return added
 
 
 def init_db():
+    """
+    Crea las tablas, columnas e índices que falten.
+
+    Returns:
+        list[str]: Columnas agregadas a tablas existentes
+    """
+    # Columnas nuevas en tablas existentes, antes de crear índices que las usen
+    added = _add_missing_columns()
     # Crear todas las tablas si no existen
     Base.metadata.create_all(bind=engine)
-
-
-# Inicializar la base de datos
-init_db()
-
-# Definir las preguntas, respuestas y palabras clave
-faq_data = [
-    {
-        "question": "¿Qué puedes hacer?",
-        "answer": ">ayuda y verás todo lo que puedo hacer en el chat por ti!!",
-        "keyword": "hacer",
-    },
-    {
-        "question": "¿Dónde puedo jugar?",
-        "answer": "juega en el chat_juego_aventura !",
-        "keyword": "jugar",
-    },
-    {
-        "question": "¿Tenemos alguna IA ?",
-        "answer": "Si en el chat tenemos a DeepSeek y LLama usa > y nombre de la IA!",
-        "keyword": "IA",
-    },
-    {
-        "question": "¿Que juegos hay?",
-        "answer": "Tenemos tateti y aventura !",
-        "keyword": "juegos",
-    },
-    {
-        "question": "¿Que musica tenemos?",
-        "answer": "Nos conectamos a la api de youtube y podemos ver videos en el chat!",
-        "keyword": "musica",
-    },
-    {
-        "question": "¿Que hacen en este chat general?",
-        "answer": "Estudiamos Python y usamos sus librerias!",
-        "keyword": "chat",
-    },
-    {
-        "question": "¿Necesito ayuda?",
-        "answer": "si quieres ayuda con algun codigo pegalo en el chat con carbon o CodeSnap!",
-        "keyword": "ayuda",
-    },
-    # Agrega más preguntas, respuestas y palabras clave aquí
-]
-
-
-# Validar los datos antes de insertarlos
-def validate_faq_data(faq):
-    if not faq.get("question") or not faq.get("answer") or not faq.get("keyword"):
-        return False
-    return True
-
-
-# Insertar las preguntas y respuestas en la base de datos usando yield
-def insert_faq_data():
-    from acciones.oyente import (
-        normalize_text,  # Import local para evitar circular import
-    )
-
-    session = next(get_db())
-    try:
-        for faq in faq_data:
-            if validate_faq_data(faq):
-                # Normalizar la keyword antes de insertar
-                keyword_norm = normalize_text(faq["keyword"])
-                # Verificar si la pregunta ya existe en la base de datos
-                existing_faq = (
-                    session.query(FAQ)
-                    .filter_by(
-                        question=faq["question"],
-                        answer=faq["answer"],
-                        keyword=keyword_norm,
-                    )
-                    .first()
-                )
-                if not existing_faq:
-                    faq_obj = FAQ(
-                        question=faq["question"],
-                        answer=faq["answer"],
-                        keyword=keyword_norm,
-                    )
-                    session.add(faq_obj)
-        session.commit()
-        print("Datos insertados correctamente en la tabla FAQ.")
-    except Exception as e:
-        session.rollback()
-        print(f"Error al insertar datos en la tabla FAQ: {e}")
-    finally:
-        session.close()
-
-
-# Ejecutar la función para insertar los datos
-insert_faq_data()
+    # create_all no agrega índices nuevos a tablas ya existentes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    return added
@@ -0,0 +1,141 @@
+"""
+Rankings top-K en memoria para >ranking y >tateti_ranking.
+
+Cada ranking se carga al iniciar con una sola consulta (las `capacity` mejores
+filas) y se actualiza en cada incremento con el total que devuelve el propio
+UPDATE/UPSERT, así que responder el ranking no toca la base de datos.
+
+Un usuario fuera del ranking solo puede entrar superando al último, y el
+incremento trae su total real, de modo que el top se mantiene exacto mientras
+todas las escrituras pasen por el bot. Para cubrir cambios hechos por otros
+procesos, reconcile() reemplaza periódicamente el contenido con lo que hay en
+la base, respetando los incrementos ocurridos durante la consulta.
+"""
+
+import asyncio
+import logging
+from typing import Any, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class Entry(NamedTuple):
+    key: str
+    name: str
+    score: int
+    # Desempate: a igual puntaje va primero el menor (p. ej. la victoria más vieja)
+    tiebreak: Any = 0
+
+    @classmethod
+    def from_row(cls, row) -> "Entry":
+        """Fila de la BD (key, name, score[, tiebreak]); un score NULL cuenta 0."""
+        key, name, score, *rest = row
+        return cls(str(key), name, int(score or 0), *rest)
+
+
+class Leaderboard:
+    """Top-K incremental; guarda `capacity` filas para mostrar menos."""
+
+    def __init__(self, name: str, capacity: int = 50):
+        self.name = name
+        self.capacity = capacity
+        self.ready = False
+        self.version = 0  # se incrementa con cada update()
+        self._entries: dict[str, tuple[Entry, int]] = {}  # key -> (fila, versión)
+        self._sorted: list[Entry] | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _sort_key(entry: Entry):
+        return (-entry.score, entry.tiebreak)
+
+    def _ordered(self) -> list[Entry]:
+        if self._sorted is None:
+            self._sorted = sorted(
+                (entry for entry, _ in self._entries.values()), key=self._sort_key
+            )
+        return self._sorted
+
+    def top(self, n: int = 10) -> list[Entry]:
+        return self._ordered()[:n]
+
+    def update(self, key, name: str, score: int, tiebreak: Any = 0) -> None:
+        """
+        Aplica el total nuevo de `key` (el valor que devolvió la BD).
+
+        Los contadores solo crecen: si llega desordenado un total menor al que
+        ya se tiene, se ignora. Las bajas solo entran por reconcile().
+        """
+        entry = Entry(str(key), name, int(score or 0), tiebreak)
+        current = self._entries.get(entry.key)
+        if current is not None and current[0].score > entry.score:
+            return
+        self.version += 1
+        if entry.key not in self._entries and len(self._entries) >= self.capacity:
+            last = self._ordered()[-1]
+            if self._sort_key(entry) >= self._sort_key(last):
+                return  # no entra en el top
+            del self._entries[last.key]
+        self._entries[entry.key] = (entry, self.version)
+        self._sorted = None
+
+    def reconcile(self, rows, since: int | None = None) -> int:
+        """
+        Reemplaza el contenido con `rows` leídas de la base.
+
+        Las filas actualizadas en memoria después de `since` (la versión tomada
+        antes de consultar) se conservan, porque son más nuevas que la consulta.
+
+        Args:
+            rows (Iterable[Entry]): Las mejores filas según la base de datos
+            since (int | None): self.version antes de lanzar la consulta
+
+        Returns:
+            int: Filas que difieren de lo que había en memoria
+        """
+        previous = self._entries
+        fresh = {
+            entry.key: (entry, 0) for entry in (Entry.from_row(row) for row in rows)
+        }
+        if since is not None:
+            for key, (entry, version) in previous.items():
+                if version > since:
+                    fresh[key] = (entry, version)
+        changed = sum(
+            1
+            for key, (entry, _) in fresh.items()
+            if key not in previous or previous[key][0] != entry
+        ) + sum(1 for key in previous if key not in fresh)
+
+        self._entries = fresh
+        self._sorted = None
+        # Si los incrementos conservados desbordan la capacidad, recortar
+        while len(self._entries) > self.capacity:
+            del self._entries[self._ordered()[-1].key]
+            self._sorted = None
+        self.ready = True
+        return changed
+
+    async def refresh(self, load) -> int:
+        """Consulta la base con `load(capacity)` y reconcilia el contenido."""
+        since = self.version
+        rows = await load(self.capacity)
+        changed = self.reconcile(rows, since=since)
+        if changed:
+            logger.info(f"Ranking {self.name}: {changed} filas corregidas desde la BD.")
+        return changed
+
+    async def run_reconcile(self, load, interval: float) -> None:
+        """Carga el ranking y lo reconcilia cada `interval` segundos."""
+        while True:
+            try:
+                await self.refresh(load)
+            except Exception as e:
+                logger.error(f"Error al reconciliar el ranking {self.name}: {e}")
+            await asyncio.sleep(interval)
+
+
+thanks_leaderboard = Leaderboard("gracias")
+tateti_leaderboard = Leaderboard("tateti")
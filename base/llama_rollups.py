@@ -0,0 +1,258 @@
+"""
+Rollups diarios, semanales y mensuales de las métricas de >llama.
+
+llama_metrics guarda una fila por (día, usuario). Este módulo la resume en
+llama_metrics_rollups a la medianoche de Montevideo (por usuario y global), de
+modo que >llama_stats 7d/30d lee unas pocas filas del índice en lugar de sumar
+toda la tabla: cada rango se cubre con los meses y semanas completos que
+contiene y días sueltos para los bordes. El día en curso siempre sale de
+llama_metrics.
+
+Al arrancar se resumen los días que falten (por ejemplo, si el bot estuvo
+apagado a la medianoche), y cada corrida vuelve a resumir el día anterior para
+recoger métricas volcadas después de la medianoche. Todas las escrituras son
+upserts que reemplazan los totales, así que repetir un día es inocuo.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+
+import pytz
+from sqlalchemy import Date, String, and_, exists, false, func, literal, or_, select
+
+from base.database import (
+    LLAMA_METRIC_FIELDS,
+    LLAMA_ROLLUP_ALL_USERS,
+    LlamaMetrics,
+    LlamaMetricsRollup,
+    dialect_insert,
+    session_scope,
+    today_uy,
+)
+from base.query_stats import db_helper
+
+logger = logging.getLogger(__name__)
+
+RANGES = {"7d": 7, "30d": 30}
+# Margen tras la medianoche para que se vuelquen las métricas pendientes del día
+ROLLUP_DELAY_SECONDS = 60
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _month_bounds(day: date) -> tuple[date, date]:
+    start = day.replace(day=1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def _upsert_rollup(source):
+    """INSERT INTO llama_metrics_rollups SELECT ... ON CONFLICT reemplazando totales."""
+    columns = ["period", "user_id", "period_start", *LLAMA_METRIC_FIELDS]
+    stmt = dialect_insert(LlamaMetricsRollup).from_select(columns, source)
+    return stmt.on_conflict_do_update(
+        index_elements=["period", "user_id", "period_start"],
+        set_={field: getattr(stmt.excluded, field) for field in LLAMA_METRIC_FIELDS},
+    )
+
+
+def _day_statements(day: date) -> list:
+    period = literal("day", String)
+    per_user = select(
+        period,
+        LlamaMetrics.user_id,
+        LlamaMetrics.date,
+        *(func.coalesce(getattr(LlamaMetrics, f), 0) for f in LLAMA_METRIC_FIELDS),
+    ).where(LlamaMetrics.date == day)
+    all_users = select(
+        period,
+        literal(LLAMA_ROLLUP_ALL_USERS, String),
+        literal(day, Date),
+        *(
+            func.coalesce(func.sum(getattr(LlamaMetrics, f)), 0)
+            for f in LLAMA_METRIC_FIELDS
+        ),
+    ).where(LlamaMetrics.date == day)
+    return [_upsert_rollup(per_user), _upsert_rollup(all_users)]
+
+
+def _period_statement(period: str, start: date, end: date):
+    """Resume las filas diarias entre start y end en una fila `period` por usuario."""
+    R = LlamaMetricsRollup
+    source = (
+        select(
+            literal(period, String),
+            R.user_id,
+            literal(start, Date),
+            *(func.sum(getattr(R, f)) for f in LLAMA_METRIC_FIELDS),
+        )
+        .where(R.period == "day", R.period_start.between(start, end))
+        .group_by(R.user_id)
+    )
+    return _upsert_rollup(source)
+
+
+@db_helper
+async def rollup_llama_days(days) -> int:
+    """
+    Resume los días indicados y recalcula sus semanas y meses.
+
+    Returns:
+        int: Cantidad de días resumidos
+    """
+    days = sorted(set(days))
+    periods = set()
+    for day in days:
+        async with session_scope() as db:
+            for stmt in _day_statements(day):
+                await db.execute(stmt)
+        week = _week_start(day)
+        periods.add(("week", week, week + timedelta(days=6)))
+        periods.add(("month", *_month_bounds(day)))
+    for period, start, end in sorted(periods):
+        async with session_scope() as db:
+            await db.execute(_period_statement(period, start, end))
+    return len(days)
+
+
+@db_helper
+async def pending_rollup_days(today: date | None = None) -> list[date]:
+    """Días anteriores a hoy sin rollup global, más el día de ayer."""
+    today = today or today_uy()
+    R = LlamaMetricsRollup
+    async with session_scope() as db:
+        result = await db.execute(
+            select(LlamaMetrics.date)
+            .distinct()
+            .where(
+                LlamaMetrics.date < today,
+                ~exists().where(
+                    and_(
+                        R.period == "day",
+                        R.user_id == LLAMA_ROLLUP_ALL_USERS,
+                        R.period_start == LlamaMetrics.date,
+                    )
+                ),
+            )
+        )
+        missing = set(result.scalars())
+    return sorted(missing | {today - timedelta(days=1)})
+
+
+def _weeks_and_days(start: date, end: date, periods: dict) -> None:
+    day = start
+    while day <= end:
+        if day == _week_start(day) and day + timedelta(days=6) <= end:
+            periods["week"].append(day)
+            day += timedelta(days=7)
+        else:
+            periods["day"].append(day)
+            day += timedelta(days=1)
+
+
+def range_periods(start: date, end: date) -> dict[str, list[date]]:
+    """
+    Cubre los días de start a end (inclusive) con pocos rollups.
+
+    Primero toma los meses enteros que caben en el rango; los huecos que
+    quedan se cubren con semanas enteras (de lunes a domingo) y días sueltos.
+
+    Returns:
+        dict[str, list[date]]: period_start de cada período, por tipo de período
+    """
+    periods = {"day": [], "week": [], "month": []}
+    gap_start = start
+    month_start, month_end = _month_bounds(start)
+    if month_start < start:
+        month_start, month_end = _month_bounds(month_end + timedelta(days=1))
+    while month_end <= end:
+        _weeks_and_days(gap_start, month_start - timedelta(days=1), periods)
+        periods["month"].append(month_start)
+        gap_start = month_end + timedelta(days=1)
+        month_start, month_end = _month_bounds(gap_start)
+    _weeks_and_days(gap_start, end, periods)
+    return periods
+
+
+@db_helper
+async def get_llama_range_metrics(user_id=None, days=7):
+    """
+    Totales de los últimos `days` días, hoy incluido.
+
+    Los días cerrados salen de los rollups (los meses y semanas completos del
+    rango y los días sueltos de los bordes, una sola consulta por clave
+    primaria); el día en curso, de llama_metrics.
+
+    Args:
+        user_id (str | None): Usuario de Discord, o None para el total global
+        days (int): Cantidad de días, contando hoy
+
+    Returns:
+        tuple: Un total por cada campo de LLAMA_METRIC_FIELDS, en ese orden
+    """
+    today = today_uy()
+    R = LlamaMetricsRollup
+    key = LLAMA_ROLLUP_ALL_USERS if user_id is None else str(user_id)
+    periods = range_periods(today - timedelta(days=days - 1), today - timedelta(days=1))
+    closed = select(
+        *(func.coalesce(func.sum(getattr(R, f)), 0) for f in LLAMA_METRIC_FIELDS)
+    ).where(
+        R.user_id == key,
+        or_(
+            *(
+                and_(R.period == period, R.period_start.in_(starts))
+                for period, starts in periods.items()
+                if starts
+            ),
+            false(),
+        ),
+    )
+    current = select(
+        *(
+            func.coalesce(func.sum(getattr(LlamaMetrics, f)), 0)
+            for f in LLAMA_METRIC_FIELDS
+        )
+    ).where(LlamaMetrics.date == today)
+    if user_id is not None:
+        current = current.where(LlamaMetrics.user_id == key)
+
+    async with session_scope() as db:
+        past = (await db.execute(closed)).one()
+        live = (await db.execute(current)).one()
+    return tuple(int(a or 0) + int(b or 0) for a, b in zip(past, live, strict=True))
+
+
+def seconds_until_next_midnight_uy(now: datetime | None = None) -> float:
+    """Segundos hasta la próxima medianoche de Montevideo."""
+    tz = pytz.timezone("America/Montevideo")
+    now = now or datetime.now(tz)
+    midnight = tz.localize(
+        datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    )
+    return max((midnight - now).total_seconds(), 0.0)
+
+
+async def run_daily_rollups(before_rollup=None) -> None:
+    """
+    Resume los días pendientes al arrancar y luego cada medianoche de Montevideo.
+
+    Args:
+        before_rollup: Corutina opcional a esperar antes de cada corrida (por
+            ejemplo, volcar las métricas acumuladas en memoria)
+    """
+    while True:
+        try:
+            if before_rollup is not None:
+                await before_rollup()
+            days = await pending_rollup_days()
+            await rollup_llama_days(days)
+            logger.info(
+                "Rollups de llama actualizados: "
+                + ", ".join(day.isoformat() for day in days)
+            )
+        except Exception as e:
+            logger.error(f"Error al generar rollups de llama: {e}", exc_info=True)
+        await asyncio.sleep(seconds_until_next_midnight_uy() + ROLLUP_DELAY_SECONDS)
@@ -0,0 +1,197 @@
+"""
+Comandos de mantenimiento de la base de datos.
+
+Crea el esquema y carga los datos iniciales de forma explícita, en lugar de
+hacerlo al importar base.database. Uso:
+
+    uv run python -m base.manage migrate   # crea tablas, columnas e índices faltantes
+    uv run python -m base.manage seed      # carga/actualiza las FAQ
+    uv run python -m base.manage init      # migrate + seed
+    uv run python -m base.manage rebuild   # reconstruye los resúmenes desde el historial
+
+init corre en cada arranque del contenedor, así que migrate solo reconstruye
+tateti_win_counts cuando acaba de crear la tabla (backfill de las victorias
+anteriores al resumen); si alguna vez se desincroniza, usar rebuild.
+"""
+
+import argparse
+import logging
+import sys
+
+from sqlalchemy import bindparam, inspect, select, update
+
+from base.database import (
+    FAQ,
+    TatetiWinCount,
+    engine,
+    init_db,
+    rebuild_tateti_win_counts,
+    sync_session_scope,
+)
+from base.query_stats import db_helper
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Definir las preguntas, respuestas y palabras clave
+faq_data = [
+    {
+        "question": "¿Qué puedes hacer?",
+        "answer": ">ayuda y verás todo lo que puedo hacer en el chat por ti!!",
+        "keyword": "hacer",
+    },
+    {
+        "question": "¿Dónde puedo jugar?",
+        "answer": "juega en el chat_juego_aventura !",
+        "keyword": "jugar",
+    },
+    {
+        "question": "¿Tenemos alguna IA ?",
+        "answer": "Si en el chat tenemos a DeepSeek y LLama usa > y nombre de la IA!",
+        "keyword": "IA",
+    },
+    {
+        "question": "¿Que juegos hay?",
+        "answer": "Tenemos tateti y aventura !",
+        "keyword": "juegos",
+    },
+    {
+        "question": "¿Que musica tenemos?",
+        "answer": "Nos conectamos a la api de youtube y podemos ver videos en el chat!",
+        "keyword": "musica",
+    },
+    {
+        "question": "¿Que hacen en este chat general?",
+        "answer": "Estudiamos Python y usamos sus librerias!",
+        "keyword": "chat",
+    },
+    {
+        "question": "¿Necesito ayuda?",
+        "answer": "si quieres ayuda con algun codigo pegalo en el chat con carbon o CodeSnap!",
+        "keyword": "ayuda",
+    },
+    # Agrega más preguntas, respuestas y palabras clave aquí
+]
+
+
+# Validar los datos antes de insertarlos
+def validate_faq_data(faq):
+    if not faq.get("question") or not faq.get("answer") or not faq.get("keyword"):
+        return False
+    return True
+
+
+@db_helper
+def seed_faq(session, data=faq_data):
+    """
+    Inserta o actualiza las FAQ en lote de forma idempotente.
+
+    Lee las preguntas existentes con un único SELECT y luego hace un INSERT en
+    lote para las nuevas y un UPDATE en lote para las que cambiaron, en vez de
+    una consulta por fila. La pregunta es la clave natural de cada FAQ.
+
+    Returns:
+        tuple[int, int]: Cantidad de FAQ insertadas y actualizadas
+    """
+    from acciones.oyente import (
+        normalize_text,  # Import local para evitar circular import
+    )
+
+    wanted = {}
+    for faq in data:
+        if not validate_faq_data(faq):
+            logger.warning(f"FAQ inválida, se omite: {faq}")
+            continue
+        wanted[faq["question"]] = {
+            "question": faq["question"],
+            "answer": faq["answer"],
+            # Normalizar la keyword antes de insertar
+            "keyword": normalize_text(faq["keyword"]),
+        }
+
+    existing = {
+        row.question: row
+        for row in session.execute(
+            select(FAQ.id, FAQ.question, FAQ.answer, FAQ.keyword).where(
+                FAQ.question.in_(list(wanted))
+            )
+        )
+    }
+
+    to_insert = [faq for question, faq in wanted.items() if question not in existing]
+    to_update = [
+        {
+            "faq_id": existing[question].id,
+            "new_answer": faq["answer"],
+            "new_keyword": faq["keyword"],
+        }
+        for question, faq in wanted.items()
+        if question in existing
+        and (existing[question].answer, existing[question].keyword)
+        != (faq["answer"], faq["keyword"])
+    ]
+
+    if to_insert:
+        session.execute(FAQ.__table__.insert(), to_insert)
+    if to_update:
+        session.execute(
+            update(FAQ.__table__)
+            .where(FAQ.__table__.c.id == bindparam("faq_id"))
+            .values(answer=bindparam("new_answer"), keyword=bindparam("new_keyword")),
+            to_update,
+        )
+    return len(to_insert), len(to_update)
+
+
+def migrate():
+    """Crea las tablas, columnas e índices que falten."""
+    had_win_counts = inspect(engine).has_table(TatetiWinCount.__tablename__)
+    added = init_db()
+    if added:
+        logger.info(f"Columnas agregadas: {', '.join(added)}")
+    logger.info("Esquema de base de datos actualizado.")
+    # Backfill del resumen solo cuando la tabla es nueva
+    if not had_win_counts:
+        rebuild()
+
+
+def rebuild():
+    """Reconstruye el resumen de victorias de tateti desde tateti_winners."""
+    with sync_session_scope() as session:
+        jugadores = rebuild_tateti_win_counts(session)
+    logger.info(f"Resumen de victorias de tateti reconstruido: {jugadores} jugadores.")
+
+
+def seed():
+    """Carga los datos iniciales (FAQ)."""
+    with sync_session_scope() as session:
+        inserted, updated = seed_faq(session)
+    logger.info(f"FAQ cargadas: {inserted} nuevas, {updated} actualizadas.")
+
+
+COMMANDS = {
+    "migrate": [migrate],
+    "seed": [seed],
+    "init": [migrate, seed],
+    "rebuild": [rebuild],
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m base.manage",
+        description="Mantenimiento de la base de datos del bot.",
+    )
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    try:
+        for step in COMMANDS[args.command]:
+            step()
+    except Exception as e:
+        logger.error(f"Error ejecutando '{args.command}': {e}", exc_info=True)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
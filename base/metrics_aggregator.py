@@ -0,0 +1,171 @@
+"""
+Agregador write-behind para las métricas de >llama.
+
+En lugar de abrir una sesión y hacer varios commits por cada consulta, los
+comandos registran deltas en memoria agrupados por (fecha, usuario) y una tarea
+en segundo plano los vuelca cada pocos segundos con un único upsert en lote.
+
+Además lleva el total global del día en curso, sembrado desde la BD al
+arrancar y actualizado en cada registro, para que >llama_dashboard y
+>llama_stats True no hagan SUM() sobre llama_metrics.
+"""
+
+import asyncio
+import logging
+import time
+
+from base.database import (
+    LLAMA_METRIC_FIELDS,
+    get_global_metrics,
+    today_uy,
+    upsert_llama_metrics_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LlamaMetricsAggregator:
+    """Acumula deltas de LlamaMetrics en memoria y los persiste periódicamente."""
+
+    def __init__(self, flush_interval: float = 10.0):
+        self.flush_interval = flush_interval
+        # (fecha, user_id) -> {campo: delta}
+        self._pending: dict[tuple, dict[str, int]] = {}
+        self._pending_deltas = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # Estadísticas para ver el agregador funcionando
+        self.last_flush_latency: float | None = None  # segundos
+        self.last_flush_rows = 0
+        self.flush_count = 0
+        self.failed_flushes = 0
+        # Totales globales del día en curso (fecha de Montevideo)
+        self._today = today_uy()
+        self._today_totals = dict.fromkeys(LLAMA_METRIC_FIELDS, 0)
+        self.version = 0  # cambia con cada registro; sirve de clave de caché
+
+    @property
+    def pending_rows(self) -> int:
+        """Cantidad de filas (fecha, usuario) esperando ser volcadas."""
+        return len(self._pending)
+
+    @property
+    def pending_deltas(self) -> int:
+        """Cantidad de incrementos registrados desde el último flush exitoso."""
+        return self._pending_deltas
+
+    def _roll_day(self, today) -> None:
+        """Reinicia los totales globales al cambiar el día."""
+        if today != self._today:
+            self._today = today
+            self._today_totals = dict.fromkeys(LLAMA_METRIC_FIELDS, 0)
+            self.version += 1
+
+    def record(self, user_id: str, **deltas: int) -> None:
+        """Registra deltas para la fila de hoy del usuario. Es O(1) y no toca la BD."""
+        today = today_uy()
+        self._roll_day(today)
+        key = (today, str(user_id))
+        row = self._pending.get(key)
+        if row is None:
+            row = self._pending[key] = dict.fromkeys(LLAMA_METRIC_FIELDS, 0)
+        for field, amount in deltas.items():
+            if field not in row:
+                raise ValueError(f"Métrica desconocida: {field}")
+            if amount:
+                row[field] += int(amount)
+                self._today_totals[field] += int(amount)
+                self._pending_deltas += 1
+        self.version += 1
+
+    async def seed(self) -> None:
+        """
+        Carga los totales globales de hoy desde la BD.
+
+        Debe llamarse al arrancar, antes de registrar métricas: lo ya volcado
+        viene de la BD y lo pendiente en memoria se suma encima.
+        """
+        # Con el lock ningún lote queda a medio volcar durante la lectura
+        async with self._lock:
+            result = await get_global_metrics()
+            self._today = today_uy()
+            self._today_totals = {
+                field: int(value or 0)
+                for field, value in zip(LLAMA_METRIC_FIELDS, result, strict=True)
+            }
+            for (date, _user_id), row in self._pending.items():
+                if date == self._today:
+                    for field, amount in row.items():
+                        self._today_totals[field] += amount
+            self.version += 1
+
+    def today_totals(self) -> tuple:
+        """Totales globales de hoy, en el orden de LLAMA_METRIC_FIELDS."""
+        self._roll_day(today_uy())
+        return tuple(self._today_totals[field] for field in LLAMA_METRIC_FIELDS)
+
+    def _merge_back(self, batch: dict, deltas: int) -> None:
+        """Reincorpora un lote que no se pudo volcar para no perder datos."""
+        for key, row in batch.items():
+            current = self._pending.setdefault(
+                key, dict.fromkeys(LLAMA_METRIC_FIELDS, 0)
+            )
+            for field, amount in row.items():
+                current[field] += amount
+        self._pending_deltas += deltas
+
+    async def flush(self) -> int:
+        """
+        Vuelca todos los deltas pendientes con un único upsert en lote.
+
+        Returns:
+            int: Cantidad de filas volcadas
+        """
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            deltas, self._pending_deltas = self._pending_deltas, 0
+            rows = [
+                {"date": date, "user_id": user_id, **row}
+                for (date, user_id), row in batch.items()
+            ]
+            start = time.perf_counter()
+            try:
+                await upsert_llama_metrics_batch(rows)
+            except Exception:
+                self.failed_flushes += 1
+                self._merge_back(batch, deltas)
+                raise
+            self.last_flush_latency = time.perf_counter() - start
+            self.last_flush_rows = len(rows)
+            self.flush_count += 1
+            logger.debug(
+                f"Métricas de llama volcadas: {len(rows)} filas, {deltas} deltas "
+                f"en {self.last_flush_latency * 1000:.1f} ms"
+            )
+            return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error al volcar métricas de llama: {e}", exc_info=True)
+
+    def start(self) -> None:
+        """Inicia la tarea periódica de volcado si no está corriendo."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Detiene la tarea periódica y hace un último volcado."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,244 @@
+"""
+Métricas del pool de conexiones y detección de conexiones retenidas.
+
+Escucha los eventos checkout/checkin del pool de SQLAlchemy para contar
+préstamos y devoluciones, medir cuánto tiempo se retiene cada conexión y, en
+modo debug, guardar la pila de quien la pidió. Una tarea periódica registra en
+el log toda conexión retenida más de N segundos junto con esa pila, para
+encontrar sesiones que nunca se cierran, y cada cierto tiempo el estado del
+pool (conexiones prestadas, overflow y quién espera por una libre).
+
+SQLAlchemy no tiene un evento "antes del checkout", así que para contar las
+esperas attach() envuelve la obtención de conexiones del pool: solo cuenta
+como espera un pedido que llega con el pool agotado (todas las conexiones de
+size + max_overflow prestadas), y mide cuánto tiempo queda bloqueado.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+import traceback
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Biblioteca estándar (asyncio incluido): sus frames no aportan al diagnóstico
+_STDLIB_PATH = os.path.dirname(os.__file__)
+
+
+def _caller_stack(limit: int = 12) -> str:
+    """
+    Pila del código del bot que pidió la conexión.
+
+    Con el motor async el checkout ocurre dentro de un greenlet de SQLAlchemy;
+    la pila útil (helper, cog, comando) está en el greenlet padre.
+    """
+    frame = None
+    try:
+        import greenlet
+
+        parent = greenlet.getcurrent().parent
+        if parent is not None:
+            frame = parent.gr_frame
+    except ImportError:
+        pass
+    if frame is None:
+        frame = sys._getframe(2)
+
+    summary = [
+        entry
+        for entry in traceback.extract_stack(frame)
+        if not entry.filename.startswith(_STDLIB_PATH)
+        and "site-packages" not in entry.filename
+    ]
+    return "".join(traceback.format_list(summary[-limit:]))
+
+
+class PoolMonitor:
+    """Contadores de checkout/checkin y registro de conexiones en uso."""
+
+    def __init__(self, name: str, leak_seconds: float = 10.0, debug: bool = False):
+        self.name = name
+        self.leak_seconds = leak_seconds
+        self.debug = debug
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.leaks_reported = 0
+        self.max_hold = 0.0  # segundos
+        self.total_hold = 0.0
+        self.waiters = 0  # pedidos bloqueados con el pool agotado
+        self.max_waiters = 0
+        self.waits = 0  # pedidos que tuvieron que esperar
+        self.total_wait = 0.0  # segundos
+        self.max_wait = 0.0
+        self._pool = None
+        # id(connection_record) -> [inicio, pila, ya_reportada]
+        self._held: dict[int, list] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def in_use(self) -> int:
+        return len(self._held)
+
+    @property
+    def avg_hold_ms(self) -> float:
+        return (self.total_hold / self.checkins) * 1000 if self.checkins else 0.0
+
+    @property
+    def avg_wait_ms(self) -> float:
+        return (self.total_wait / self.waits) * 1000 if self.waits else 0.0
+
+    def attach(self, engine) -> None:
+        """Registra los listeners en el pool de un Engine síncrono."""
+        self._track_waits(engine.pool)
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        # dispose() reemplaza el pool por uno nuevo: volver a envolverlo
+        event.listen(engine, "engine_disposed", lambda eng: self._track_waits(eng.pool))
+
+    @staticmethod
+    def _exhausted(pool) -> bool:
+        """True si todas las conexiones que permite el pool están prestadas."""
+        max_overflow = getattr(pool, "_max_overflow", None)
+        if max_overflow is None or max_overflow < 0:
+            return False  # pool sin límite (o que no encola pedidos)
+        return pool.checkedout() >= pool.size() + max_overflow
+
+    def _track_waits(self, pool) -> None:
+        """Envuelve pool._do_get para medir los pedidos que esperan turno."""
+        self._pool = pool
+        if not hasattr(pool, "checkedout"):
+            return
+        do_get = pool._do_get
+
+        def _do_get():
+            if not self._exhausted(pool):
+                return do_get()
+            self.waiters += 1
+            self.max_waiters = max(self.max_waiters, self.waiters)
+            start = time.monotonic()
+            try:
+                return do_get()
+            finally:
+                self.waiters -= 1
+                elapsed = time.monotonic() - start
+                self.waits += 1
+                self.total_wait += elapsed
+                self.max_wait = max(self.max_wait, elapsed)
+
+        pool._do_get = _do_get
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        stack = _caller_stack() if self.debug else None
+        self._held[id(connection_record)] = [time.monotonic(), stack, False]
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        held = self._held.pop(id(connection_record), None)
+        if held is None:
+            return
+        self.checkins += 1
+        elapsed = time.monotonic() - held[0]
+        self.total_hold += elapsed
+        self.max_hold = max(self.max_hold, elapsed)
+
+    def health(self) -> dict:
+        """Estado actual del pool: tamaño, prestadas, overflow y en espera."""
+        pool = self._pool
+        size = getattr(pool, "size", None)
+        overflow = getattr(pool, "overflow", None)
+        return {
+            "name": self.name,
+            "pool": type(pool).__name__ if pool is not None else "-",
+            "size": size() if callable(size) else None,
+            "checked_out": self.in_use,
+            "overflow": max(overflow(), 0) if callable(overflow) else 0,
+            "waiters": self.waiters,
+            "max_waiters": self.max_waiters,
+            "waits": self.waits,
+            "avg_wait_ms": self.avg_wait_ms,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def describe_health(self) -> str:
+        """Resumen de una línea de health() para el log y para >info."""
+        h = self.health()
+        size = h["size"] if h["size"] is not None else "-"
+        return (
+            f"{h['checked_out']}/{size} en uso, overflow {h['overflow']}, "
+            f"{h['waiters']} en espera (máx {h['max_waiters']}), "
+            f"{h['waits']} esperas (prom {h['avg_wait_ms']:.1f} ms, "
+            f"máx {h['max_wait_ms']:.1f} ms)"
+        )
+
+    def long_held(self, older_than: float | None = None) -> list[tuple[float, str]]:
+        """Conexiones en uso hace más de `older_than` segundos: (segundos, pila)."""
+        limit = self.leak_seconds if older_than is None else older_than
+        now = time.monotonic()
+        return [
+            (now - start, stack or "")
+            for start, stack, _ in self._held.values()
+            if now - start > limit
+        ]
+
+    def check_leaks(self) -> int:
+        """Registra en el log, una sola vez cada una, las conexiones retenidas de más."""
+        now = time.monotonic()
+        reported = 0
+        for held in self._held.values():
+            start, stack, already = held
+            if already or now - start <= self.leak_seconds:
+                continue
+            held[2] = True
+            reported += 1
+            message = (
+                f"[{self.name}] Conexión retenida hace {now - start:.1f} s "
+                f"(umbral {self.leak_seconds:.0f} s)"
+            )
+            if stack:
+                message += f"; pedida desde:\n{stack}"
+            logger.warning(message)
+        self.leaks_reported += reported
+        return reported
+
+    async def _run(self, interval: float, health_interval: float) -> None:
+        last_health = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            self.check_leaks()
+            if health_interval and time.monotonic() - last_health >= health_interval:
+                last_health = time.monotonic()
+                logger.info(f"[{self.name}] Pool: {self.describe_health()}")
+
+    def start(self, interval: float = 5.0, health_interval: float = 0) -> None:
+        """
+        Inicia la revisión periódica de conexiones retenidas y, si
+        `health_interval` es mayor que cero, el registro del estado del pool.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(interval, health_interval))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "in_use": self.in_use,
+            "avg_hold_ms": self.avg_hold_ms,
+            "max_hold_ms": self.max_hold * 1000,
+            "leaks_reported": self.leaks_reported,
+        }
@@ -0,0 +1,232 @@
+"""
+Instrumentación de consultas SQL.
+
+Engancha before/after_cursor_execute de los motores de SQLAlchemy y acumula un
+histograma de latencias por (SQL normalizado, helper que la originó). Las
+consultas lentas se registran en el log con los parámetros ocultos, y las
+consultas idénticas repetidas dentro de un mismo comando se marcan como posible
+patrón N+1. Los datos se consultan con el comando de administración >db_stats.
+"""
+
+import contextvars
+import functools
+import inspect
+import logging
+import re
+import time
+
+from sqlalchemy import event
+
+from config.db_config import DB_N_PLUS_ONE_THRESHOLD, DB_SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma; el último es +inf
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+# Helper de base de datos que está ejecutando la consulta (ver @db_helper)
+_current_helper = contextvars.ContextVar("db_helper", default=None)
+# Comando de Discord en curso: (nombre, {sql normalizado: repeticiones})
+_current_command = contextvars.ContextVar("db_command", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES \(\?\.\.\.\))(?:\s*,\s*\(\?\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce una sentencia a su forma canónica: sin literales ni listas de parámetros."""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _PLACEHOLDER_LIST.sub("(?...)", sql)
+    sql = _VALUES_LIST.sub(r"\1", sql)
+    return sql
+
+
+def redact_parameters(parameters, executemany: bool = False) -> str:
+    """Describe los parámetros por tipo, sin exponer sus valores."""
+
+    def shape(params):
+        if isinstance(params, dict):
+            return {key: type(value).__name__ for key, value in params.items()}
+        if isinstance(params, (list, tuple)):
+            return [type(value).__name__ for value in params]
+        return type(params).__name__
+
+    if executemany and parameters:
+        return f"{len(parameters)} filas de {shape(parameters[0])}"
+    return str(shape(parameters))
+
+
+class QueryStat:
+    """Histograma de latencias de una consulta normalizada."""
+
+    __slots__ = ("count", "total", "max", "buckets", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0  # segundos
+        self.max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.slow = 0
+
+    def add(self, elapsed: float, slow: bool) -> None:
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        elapsed_ms = elapsed * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+        if slow:
+            self.slow += 1
+
+    @property
+    def avg_ms(self) -> float:
+        return (self.total / self.count) * 1000 if self.count else 0.0
+
+    def percentile_ms(self, q: float) -> float:
+        """Cota superior aproximada del percentil q según los buckets."""
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets, strict=True):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max * 1000)
+        return self.max * 1000
+
+
+class QueryStats:
+    """Registro global de latencias y patrones N+1."""
+
+    def __init__(self, slow_ms: float, n_plus_one_threshold: int):
+        self.slow_ms = slow_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.stats: dict[tuple[str, str], QueryStat] = {}
+        # (comando, sql normalizado) -> veces que se detectó el patrón
+        self.n_plus_one: dict[tuple[str, str], int] = {}
+        self.started_at = time.time()
+
+    def reset(self) -> None:
+        self.stats.clear()
+        self.n_plus_one.clear()
+        self.started_at = time.time()
+
+    def record(self, sql, source, elapsed, parameters, executemany) -> None:
+        slow = elapsed * 1000 >= self.slow_ms
+        key = (sql, source)
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = QueryStat()
+        stat.add(elapsed, slow)
+        if slow:
+            logger.warning(
+                f"Consulta lenta ({elapsed * 1000:.1f} ms) en {source}: {sql} "
+                f"| parámetros: {redact_parameters(parameters, executemany)}"
+            )
+
+        command = _current_command.get()
+        if command is not None:
+            name, counts = command
+            counts[sql] = counts.get(sql, 0) + 1
+            if counts[sql] == self.n_plus_one_threshold:
+                flag = (name, sql)
+                self.n_plus_one[flag] = self.n_plus_one.get(flag, 0) + 1
+                logger.warning(
+                    f"Posible N+1 en >{name}: la misma consulta se ejecutó "
+                    f"{self.n_plus_one_threshold} veces en un comando: {sql}"
+                )
+
+    def top(self, n: int = 10, by: str = "total") -> list:
+        """Las n consultas con mayor tiempo total (o promedio/máximo)."""
+        keyfunc = {
+            "total": lambda item: item[1].total,
+            "avg": lambda item: item[1].avg_ms,
+            "max": lambda item: item[1].max,
+            "count": lambda item: item[1].count,
+        }[by]
+        return sorted(self.stats.items(), key=keyfunc, reverse=True)[:n]
+
+
+query_stats = QueryStats(DB_SLOW_QUERY_MS, DB_N_PLUS_ONE_THRESHOLD)
+
+
+def _source() -> str:
+    helper = _current_helper.get()
+    if helper:
+        return helper
+    command = _current_command.get()
+    if command is not None:
+        return f">{command[0]}"
+    return "desconocido"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    query_stats.record(
+        normalize_sql(statement), _source(), elapsed, parameters, executemany
+    )
+
+
+def _handle_error(exception_context):
+    # Si la consulta falla no hay after_cursor_execute: descartar su inicio
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def attach(engine) -> None:
+    """Registra los hooks de medición en un Engine síncrono (o async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def db_helper(func):
+    """Etiqueta las consultas ejecutadas dentro de `func` con su nombre."""
+    name = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = _current_helper.set(name)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _current_helper.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_helper.set(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_helper.reset(token)
+
+    return wrapper
+
+
+def start_command(name: str) -> None:
+    """Abre el ámbito de un comando para detectar consultas repetidas (N+1)."""
+    _current_command.set((name, {}))
+
+
+def end_command() -> None:
+    """Cierra el ámbito del comando en curso."""
+    _current_command.set(None)
@@ -0,0 +1,143 @@
+"""
+Caché de respuestas de >llama por pregunta exacta.
+
+>llama no tiene estado: la respuesta depende solo del prompt de sistema, la
+pregunta, el modelo y la temperatura, y en el servidor las mismas preguntas
+("diferencia entre lista y tupla", "qué es un decorador") se repiten una y
+otra vez. La caché guarda la respuesta bajo el hash de (modelo, temperatura,
+pregunta normalizada), con desalojo LRU y vencimiento por TTL; un acierto no
+llama a Groq ni consume cuota de tokens.
+
+Con persistencia activada cada respuesta nueva se guarda también en la tabla
+llama_response_cache (en segundo plano, sin demorar la respuesta) y seed()
+recarga las más nuevas al arrancar, con el tiempo de vida que les quede. Cada
+escritura poda la tabla con el mismo tamaño y TTL que la caché en memoria.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+
+from base.database import load_llama_response_cache, save_llama_response, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Signos que no cambian la pregunta al principio o al final ("¿...?", "...!")
+_EDGE_PUNCTUATION = "¿?¡!.,;: "
+
+
+class CachedResponse(NamedTuple):
+    response: str
+    tokens: int  # tokens que costó generarla
+
+
+def normalize_question(question: str) -> str:
+    """
+    Forma canónica de una pregunta: sin tildes, en minúsculas, con los espacios
+    colapsados y sin signos de puntuación al principio ni al final.
+
+    La puntuación interna se conserva porque en preguntas con código importa.
+    """
+    text = unicodedata.normalize("NFKD", question)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"\s+", " ", text.casefold())
+    return text.strip(_EDGE_PUNCTUATION)
+
+
+def cache_key(question: str, model: str, temperature: float) -> str:
+    raw = f"{model}\0{temperature}\0{normalize_question(question)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU con TTL y persistencia opcional en la base de datos."""
+
+    def __init__(self, maxsize: int = 500, ttl: float = 86400.0, persist=False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.persist = persist
+        # clave -> (expira_en, CachedResponse), en orden de uso
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self._background_tasks: set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Devuelve la respuesta en caché o None (y cuenta el fallo)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, cached = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return cached
+
+    def _store(self, key: str, cached: CachedResponse, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: str, question: str, response: str, tokens: int = 0) -> None:
+        """Guarda una respuesta completa; si hay persistencia, también en la BD."""
+        if self.maxsize <= 0 or not response.strip():
+            return
+        self._store(key, CachedResponse(response, int(tokens)), self.ttl)
+        if self.persist:
+            task = asyncio.create_task(self._save(key, question, response, tokens))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _save(self, key, question, response, tokens) -> None:
+        try:
+            await save_llama_response(
+                key, question, response, tokens, utcnow(), self.maxsize, self.ttl
+            )
+        except Exception as e:
+            logger.error(f"Error al guardar la respuesta en caché: {e}")
+
+    async def seed(self) -> int:
+        """
+        Carga las respuestas persistidas que no vencieron.
+
+        Returns:
+            int: Respuestas cargadas
+        """
+        if not self.persist or self.maxsize <= 0:
+            return 0
+        rows = await load_llama_response_cache(self.maxsize, self.ttl)
+        now = utcnow()
+        # De la más vieja a la más nueva, para que las nuevas queden al frente del LRU
+        for key, _question, response, tokens, created_at in reversed(rows):
+            remaining = self.ttl - (now - (created_at or datetime.min)).total_seconds()
+            if remaining > 0:
+                self._store(key, CachedResponse(response, int(tokens or 0)), remaining)
+        return len(self._entries)
+
+    async def stop(self) -> None:
+        """Espera las escrituras pendientes en la BD."""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
@@ -0,0 +1,207 @@
+"""
+Retención y archivado de los mensajes de chat de DeepSeek.
+
+prune_old_sessions solo marca sesiones como inactivas; este módulo elimina (o
+mueve a tablas de archivo mensuales) los mensajes de las sesiones sin actividad
+desde hace más de N días, junto con sus filas de gemini_chat_history y las
+sesiones que quedan vacías. Trabaja en lotes acotados, con un commit por lote,
+para no mantener bloqueos largos sobre las tablas.
+"""
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Text,
+    cast,
+    delete,
+    exists,
+    func,
+    insert,
+    select,
+)
+
+from base.database import (
+    GeminiChatHistory,
+    GeminiChatMessage,
+    GeminiChatSession,
+    async_engine,
+    session_scope,
+    utcnow,
+)
+from base.query_stats import db_helper
+
+logger = logging.getLogger(__name__)
+
+RETENTION_MODES = ("delete", "archive")
+
+# Tablas de archivo mensuales, creadas bajo demanda (no forman parte de Base)
+_archive_metadata = MetaData()
+_archive_tables: dict[str, Table] = {}
+
+
+def _archive_table(year: int, month: int) -> Table:
+    name = f"gemini_chat_messages_archive_{year:04d}{month:02d}"
+    if name not in _archive_tables:
+        _archive_tables[name] = Table(
+            name,
+            _archive_metadata,
+            Column("id", Integer, primary_key=True),
+            Column("session_id", Integer, nullable=False),
+            Column("discord_user_id", String, nullable=False),
+            Column("role", String, nullable=False),
+            Column("content", Text, nullable=False),
+            Column("timestamp", DateTime),
+        )
+    return _archive_tables[name]
+
+
+def _content_bytes():
+    """Expresión SQL con el tamaño en bytes del contenido de un mensaje."""
+    if async_engine.dialect.name == "postgresql":
+        return func.octet_length(GeminiChatMessage.content)
+    return func.length(cast(GeminiChatMessage.content, LargeBinary))
+
+
+async def _archive_batch(db, rows) -> None:
+    """Copia un lote de mensajes a su tabla de archivo según el mes del mensaje."""
+    by_month: dict[tuple[int, int], list[int]] = {}
+    for row in rows:
+        ts = row.timestamp or utcnow()
+        by_month.setdefault((ts.year, ts.month), []).append(row.id)
+
+    for (year, month), ids in by_month.items():
+        table = _archive_table(year, month)
+        conn = await db.connection()
+        await conn.run_sync(table.create, checkfirst=True)
+        await db.execute(
+            insert(table).from_select(
+                ["id", "session_id", "discord_user_id", "role", "content", "timestamp"],
+                select(
+                    GeminiChatMessage.id,
+                    GeminiChatMessage.session_id,
+                    GeminiChatSession.discord_user_id,
+                    GeminiChatMessage.role,
+                    GeminiChatMessage.content,
+                    GeminiChatMessage.timestamp,
+                )
+                .join(
+                    GeminiChatSession,
+                    GeminiChatMessage.session_id == GeminiChatSession.id,
+                )
+                .where(GeminiChatMessage.id.in_(ids)),
+            )
+        )
+
+
+@db_helper
+async def purge_inactive_chat_messages(
+    days_inactive: int = 90,
+    mode: str = "delete",
+    batch_size: int = 500,
+    pause: float = 0.05,
+) -> dict:
+    """
+    Elimina o archiva los mensajes de sesiones inactivas hace más de `days_inactive` días.
+
+    Args:
+        days_inactive (int): Antigüedad mínima de last_updated de la sesión
+        mode (str): "delete" para borrar o "archive" para mover a tablas mensuales
+        batch_size (int): Máximo de filas por transacción
+        pause (float): Segundos de espera entre lotes para ceder la BD a otros
+
+    Returns:
+        dict: Informe con mensajes, filas de historial y sesiones eliminadas,
+            bytes de contenido liberados y lotes procesados
+    """
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"Modo de retención inválido: {mode}")
+
+    cutoff = utcnow() - timedelta(days=days_inactive)
+    report = {
+        "messages": 0,
+        "history_rows": 0,
+        "sessions": 0,
+        "bytes": 0,
+        "batches": 0,
+        "mode": mode,
+    }
+    stale_session = GeminiChatSession.last_updated < cutoff
+
+    # 1) Mensajes de sesiones inactivas, por lotes
+    while True:
+        async with session_scope() as db:
+            result = await db.execute(
+                select(
+                    GeminiChatMessage.id,
+                    GeminiChatMessage.timestamp,
+                    _content_bytes().label("size"),
+                )
+                .join(
+                    GeminiChatSession,
+                    GeminiChatMessage.session_id == GeminiChatSession.id,
+                )
+                .where(stale_session)
+                .order_by(GeminiChatMessage.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+
+            if mode == "archive":
+                await _archive_batch(db, rows)
+
+            history = await db.execute(
+                delete(GeminiChatHistory).where(GeminiChatHistory.message_id.in_(ids))
+            )
+            await db.execute(
+                delete(GeminiChatMessage).where(GeminiChatMessage.id.in_(ids))
+            )
+
+        report["messages"] += len(ids)
+        report["history_rows"] += history.rowcount or 0
+        report["bytes"] += sum(row.size or 0 for row in rows)
+        report["batches"] += 1
+        await asyncio.sleep(pause)
+
+    # 2) Sesiones inactivas que quedaron sin mensajes
+    while True:
+        async with session_scope() as db:
+            result = await db.execute(
+                select(GeminiChatSession.id)
+                .where(
+                    stale_session,
+                    ~exists().where(
+                        GeminiChatMessage.session_id == GeminiChatSession.id
+                    ),
+                )
+                .limit(batch_size)
+            )
+            ids = list(result.scalars().all())
+            if not ids:
+                break
+            history = await db.execute(
+                delete(GeminiChatHistory).where(
+                    GeminiChatHistory.chat_session_id.in_(ids)
+                )
+            )
+            await db.execute(
+                delete(GeminiChatSession).where(GeminiChatSession.id.in_(ids))
+            )
+
+        report["sessions"] += len(ids)
+        report["history_rows"] += history.rowcount or 0
+        report["batches"] += 1
+        await asyncio.sleep(pause)
+
+    return report
@@ -0,0 +1,114 @@
+"""
+Caché en proceso de filas de usuarios, por discord_id.
+
+Los comandos de agradecimientos, registro y ranking consultan una y otra vez a
+los mismos pocos cientos de miembros activos. Esta caché guarda una copia
+liviana de cada fila (no el objeto ORM, que queda ligado a su sesión) con
+expiración por TTL y desalojo LRU. Las lecturas pasan por get_user
+(read-through: >register y las altas de miembros); >gracias escribe el total
+nuevo (write-through) y el ranking precalienta las filas que lee. Las
+escrituras sobre users pasan por put()/invalidate() para que la caché nunca
+sirva un contador viejo; el TTL acota cualquier cambio hecho fuera del bot
+(por ejemplo, desde pgAdmin). Los contadores de aciertos miden las lecturas
+de get_user.
+"""
+
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from config.db_config import USER_CACHE_SIZE, USER_CACHE_TTL
+
+
+class CachedUser(NamedTuple):
+    discord_id: str
+    username: str
+    thanks_count: int
+
+
+class UserCache:
+    """LRU con TTL y contadores de aciertos para dimensionarla."""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # discord_id -> (expira_en, CachedUser), en orden de uso
+        self._entries: OrderedDict[str, tuple[float, CachedUser]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, discord_id) -> CachedUser | None:
+        """Devuelve la copia en caché o None (y cuenta el fallo)."""
+        key = str(discord_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def put(self, user) -> CachedUser:
+        """Guarda (o reemplaza) la copia de una fila de User o CachedUser."""
+        cached = CachedUser(
+            str(user.discord_id), user.username, int(user.thanks_count or 0)
+        )
+        if self.maxsize <= 0:
+            return cached
+        self._entries[cached.discord_id] = (time.monotonic() + self.ttl, cached)
+        self._entries.move_to_end(cached.discord_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return cached
+
+    def put_increment(self, user) -> CachedUser:
+        """
+        put() para el resultado de un incremento atómico del contador.
+
+        Con incrementos concurrentes los RETURNING pueden llegar desordenados;
+        si la caché ya tiene un total mayor, ese es el más reciente y se conserva.
+        """
+        entry = self._entries.get(str(user.discord_id))
+        if entry is not None and entry[1].thanks_count > (user.thanks_count or 0):
+            return CachedUser(
+                str(user.discord_id), user.username, int(user.thanks_count or 0)
+            )
+        return self.put(user)
+
+    def invalidate(self, discord_id) -> None:
+        self._entries.pop(str(discord_id), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
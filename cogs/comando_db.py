@@ -0,0 +1,161 @@
+import time
+
+from discord.ext import commands
+from table2ascii import PresetStyle
+from table2ascii import table2ascii as t2a
+
+from base.database import async_pool_monitor, sync_pool_monitor
+from base.query_stats import query_stats
+from base.user_cache import user_cache
+from config.db_config import DB_POOL_HEALTH_INTERVAL
+
+
+def _truncate(text: str, length: int) -> str:
+    return text if len(text) <= length else text[: length - 1] + "…"
+
+
+class ComandoDB(commands.Cog):
+    """Comandos de administración para diagnosticar la base de datos."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        # Revisión periódica de conexiones retenidas y del estado del pool
+        sync_pool_monitor.start(health_interval=DB_POOL_HEALTH_INTERVAL)
+        async_pool_monitor.start(health_interval=DB_POOL_HEALTH_INTERVAL)
+
+    async def cog_unload(self):
+        sync_pool_monitor.stop()
+        async_pool_monitor.stop()
+
+    @commands.command(name="db_stats")
+    @commands.has_permissions(administrator=True)
+    async def db_stats(self, ctx, orden: str = "total"):
+        """
+        Muestra las consultas SQL más costosas desde el arranque (solo administradores).
+        Uso: >db_stats [total|avg|max|count|reset]
+        """
+        orden = orden.lower()
+        if orden == "reset":
+            query_stats.reset()
+            await ctx.send("Estadísticas de consultas reiniciadas.")
+            return
+        if orden not in ("total", "avg", "max", "count"):
+            await ctx.send("Uso: >db_stats [total|avg|max|count|reset]")
+            return
+
+        top = query_stats.top(10, by=orden)
+        if not top:
+            await ctx.send("Todavía no se registraron consultas.")
+            return
+
+        body = [
+            [
+                _truncate(source, 28),
+                stat.count,
+                f"{stat.avg_ms:.1f}",
+                f"{stat.percentile_ms(0.95):.1f}",
+                f"{stat.max * 1000:.1f}",
+                stat.slow,
+            ]
+            for (_sql, source), stat in top
+        ]
+        tabla = t2a(
+            header=["Origen", "N", "Prom ms", "p95 ms", "Máx ms", "Lentas"],
+            body=body,
+            style=PresetStyle.thin_compact,
+        )
+        consultas = "\n".join(
+            f"{i}. {_truncate(sql, 160)}" for i, ((sql, _src), _) in enumerate(top, 1)
+        )
+        minutos = (time.time() - query_stats.started_at) / 60
+        cache = user_cache.snapshot()
+        partes = [
+            f"**Consultas SQL (orden: {orden}, últimos {minutos:.0f} min, "
+            f"lentas >= {query_stats.slow_ms:.0f} ms)**\n```\n{tabla}\n```"
+            f"Caché de usuarios (lecturas de get_user: >register y altas): "
+            f"{cache['size']}/{cache['maxsize']} entradas, "
+            f"aciertos {cache['hit_ratio']:.0%} ({cache['hits']}/"
+            f"{cache['hits'] + cache['misses']}), desalojos {cache['evictions']}, "
+            f"expiradas {cache['expirations']}",
+            f"```sql\n{_truncate(consultas, 1980)}\n```",
+        ]
+
+        if query_stats.n_plus_one:
+            sospechosos = sorted(
+                query_stats.n_plus_one.items(), key=lambda item: item[1], reverse=True
+            )[:5]
+            partes.append(
+                "**Posibles N+1:**\n"
+                + "\n".join(
+                    f"• >{comando} ({veces}x): `{_truncate(sql, 120)}`"
+                    for (comando, sql), veces in sospechosos
+                )
+            )
+
+        for parte in partes:
+            await ctx.send(parte)
+
+    @commands.command(name="db_pool")
+    @commands.has_permissions(administrator=True)
+    async def db_pool(self, ctx):
+        """
+        Muestra préstamos y devoluciones de conexiones y las retenidas de más
+        (solo administradores).
+        """
+        monitores = (sync_pool_monitor, async_pool_monitor)
+        body = [
+            [
+                snap["name"],
+                snap["checkouts"],
+                snap["checkins"],
+                snap["in_use"],
+                f"{snap['avg_hold_ms']:.1f}",
+                f"{snap['max_hold_ms']:.1f}",
+                snap["leaks_reported"],
+            ]
+            for snap in (monitor.snapshot() for monitor in monitores)
+        ]
+        tabla = t2a(
+            header=[
+                "Pool",
+                "Préstamos",
+                "Devol.",
+                "En uso",
+                "Prom ms",
+                "Máx ms",
+                "Fugas",
+            ],
+            body=body,
+            style=PresetStyle.thin_compact,
+        )
+        estado = "\n".join(
+            f"{monitor.name}: {monitor.describe_health()}" for monitor in monitores
+        )
+        partes = [f"**Pool de conexiones**\n```\n{tabla}\n{estado}\n```"]
+
+        for monitor in monitores:
+            for segundos, pila in monitor.long_held():
+                detalle = f"\n```\n{_truncate(pila, 1500)}\n```" if pila else ""
+                partes.append(
+                    f"**[{monitor.name}] Conexión retenida hace {segundos:.1f} s**"
+                    + detalle
+                )
+        if len(partes) == 1 and not sync_pool_monitor.debug:
+            partes[0] += "\nActiva DB_POOL_DEBUG para guardar la pila de cada préstamo."
+
+        for parte in partes:
+            await ctx.send(parte)
+
+    @db_stats.error
+    @db_pool.error
+    async def db_stats_error(self, ctx, error):
+        if isinstance(error, commands.MissingPermissions):
+            await ctx.send("Este comando es solo para administradores.")
+        else:
+            raise error
+
+
+async def setup(bot):
+    await bot.add_cog(ComandoDB(bot))
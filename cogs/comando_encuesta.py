@@ -20,7 +20,7 @@ class EncuestaCog(commands.Cog):
         Ejemplo: >encuesta ¿Quién gana el partido? | Peñarol | Nacional
         """
         # Separar pregunta y opciones usando el delimitador |
-        partes = [parte.strip() for parte in texto.split('|')]
+        partes = [parte.strip() for parte in texto.split("|")]
 
         if len(partes) < 3:
             await ctx.send(
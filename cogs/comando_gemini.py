@@ -7,23 +7,33 @@ import asyncio
 import io
 import logging
 import os
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timezone
+from contextlib import aclosing
 
 import discord
+import httpx
 from discord.ext import commands
-from openai import OpenAI
+from openai import APITimeoutError, AsyncOpenAI
 from PIL import Image
 
+from acciones.streaming import EmbedStreamer
 from base.database import (
-    add_message_to_session,
-    get_or_create_gemini_session,
-    get_session_messages,
+    append_exchange,
+    get_recent_history,
     prune_old_sessions,
     reset_gemini_session,
 )
+from base.retention import purge_inactive_chat_messages
+from config.db_config import (
+    CHAT_RETENTION_BATCH_SIZE,
+    CHAT_RETENTION_DAYS,
+    CHAT_RETENTION_INTERVAL_HOURS,
+    CHAT_RETENTION_MODE,
+)
 from config.ia_config import (
     BASE_EMBED_COLORS,
+    DEEPSEEK_CONNECT_TIMEOUT,
+    DEEPSEEK_KEEPALIVE_SECONDS,
+    DEEPSEEK_MAX_CONCURRENCY,
     DEEPSEEK_TIMEOUT,
     EMBED_COLORS,
     LANGUAGE_MAP,
@@ -57,37 +67,85 @@ class ComandoGemini(commands.Cog):
             )
             raise ValueError("DEEPSEEK_API_KEY es requerida")
 
-        self.client = OpenAI(
-            api_key=deepseek_api_key, base_url="https://api.deepseek.com"
+        # Cliente async sobre un único pool de conexiones keep-alive, que dura
+        # lo que el cog. Los 429, errores de conexión y timeouts se reintentan
+        # con espera exponencial dentro del propio cliente (max_retries).
+        self.client = AsyncOpenAI(
+            api_key=deepseek_api_key,
+            base_url="https://api.deepseek.com",
+            max_retries=2,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=DEEPSEEK_MAX_CONCURRENCY,
+                    max_keepalive_connections=DEEPSEEK_MAX_CONCURRENCY,
+                    keepalive_expiry=DEEPSEEK_KEEPALIVE_SECONDS,
+                ),
+                timeout=httpx.Timeout(
+                    DEEPSEEK_TIMEOUT, connect=DEEPSEEK_CONNECT_TIMEOUT
+                ),
+            ),
         )
         self.model_name = "deepseek-chat"
+        # Limita las consultas simultáneas; las demás esperan su turno sin
+        # ocupar hilos ni conexiones
+        self._semaphore = asyncio.Semaphore(DEEPSEEK_MAX_CONCURRENCY)
         # Se mantiene un diccionario en memoria como caché temporal para evitar excesivas consultas a BD
         self.chat_cache: dict[int, list] = {}
-        # Crear pool de hilos para operaciones bloqueantes
-        self.thread_pool = ThreadPoolExecutor(max_workers=5)
         # Inicializar índice para rotación de colores
         self.embed_color_index = 0
-        # Limpiar sesiones inactivas (opcional)
-        try:
-            prune_old_sessions(days_inactive=30)
-            logger.info("Se han limpiado sesiones inactivas de más de 30 días")
-        except Exception as e:
-            logger.error(f"Error al limpiar sesiones antiguas: {e}", exc_info=True)
+        # Tareas de persistencia en segundo plano (se guarda la referencia para
+        # que no las recoja el GC y poder esperarlas al descargar el cog)
+        self._background_tasks: set[asyncio.Task] = set()
+        self._retention_task: asyncio.Task | None = None
+
+    async def cog_load(self):
+        """
+        Se llama cuando el cog es cargado.
+        Arranca la tarea periódica de limpieza y retención de sesiones.
+        """
+        self._retention_task = asyncio.create_task(self._retention_loop())
+
+    async def _retention_loop(self):
+        """
+        Desactiva sesiones sin uso y purga (o archiva) los mensajes de las
+        sesiones inactivas hace más de CHAT_RETENTION_DAYS días.
+        """
+        while True:
+            try:
+                await prune_old_sessions(days_inactive=30)
+                logger.info("Se han limpiado sesiones inactivas de más de 30 días")
+                report = await purge_inactive_chat_messages(
+                    days_inactive=CHAT_RETENTION_DAYS,
+                    mode=CHAT_RETENTION_MODE,
+                    batch_size=CHAT_RETENTION_BATCH_SIZE,
+                )
+                logger.info(
+                    f"Retención de chat ({report['mode']}): {report['messages']} "
+                    f"mensajes, {report['history_rows']} filas de historial y "
+                    f"{report['sessions']} sesiones eliminadas; "
+                    f"{report['bytes'] / 1024:.1f} KiB liberados "
+                    f"en {report['batches']} lotes"
+                )
+            except Exception as e:
+                logger.error(f"Error en la retención de sesiones: {e}", exc_info=True)
+            await asyncio.sleep(CHAT_RETENTION_INTERVAL_HOURS * 3600)
 
     async def cog_unload(self):
         """
         Se llama cuando el cog es descargado.
-        Cierra correctamente el ThreadPoolExecutor para liberar recursos.
+        Detiene la retención, espera las escrituras pendientes y cierra el
+        pool de conexiones de DeepSeek.
         """
-        if self.thread_pool:
-            self.thread_pool.shutdown(wait=True)
-            logger.info(
-                "ThreadPoolExecutor cerrado correctamente al descargar ComandoGemini."
-            )
+        if self._retention_task:
+            self._retention_task.cancel()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.client.close()
+        logger.info("Cliente de DeepSeek cerrado al descargar ComandoGemini.")
 
     async def _get_user_chat_session(self, user_id: int) -> list:
         """
-        Obtiene o crea una sesión de chat para un usuario específico.
+        Obtiene el historial de chat reciente de un usuario específico.
         Utiliza la base de datos para persistencia.
 
         Args:
@@ -100,62 +158,52 @@ class ComandoGemini(commands.Cog):
         if user_id in self.chat_cache:
             return self.chat_cache[user_id]
 
-        # Obtenemos o creamos la sesión en la base de datos
-        db_session = get_or_create_gemini_session(user_id)
-
-        # Recuperamos los mensajes históricos de la BD
-        db_messages = get_session_messages(db_session.id, limit=MAX_HISTORY_LENGTH)
+        # Recuperamos los últimos mensajes de la sesión activa en una sola consulta
+        db_messages = await get_recent_history(user_id, limit=MAX_HISTORY_LENGTH)
 
         # Convertimos los mensajes de la BD al formato que espera OpenAI API
         history = []
-        for msg in db_messages:
+        for msg_role, content in db_messages:
             # DeepSeek usa 'user' y 'assistant' como roles
-            role = "assistant" if msg.role == "model" else "user"
-            history.append({"role": role, "content": msg.content})
+            role = "assistant" if msg_role == "model" else "user"
+            history.append({"role": role, "content": content})
 
         # Guardamos en caché para futuras consultas
         self.chat_cache[user_id] = history
 
         return history
 
-    async def _chunk_and_send(self, ctx: commands.Context, text: str) -> None:
+    async def _persist_exchange(
+        self, user_id: int, user_text: str, model_text: str
+    ) -> None:
         """
-        Divide un mensaje largo en trozos más pequeños y los envía como embeds con colores alternados.
+        Guarda el intercambio en la BD. Se ejecuta en segundo plano tras responder.
 
         Args:
-            ctx: Contexto del comando
-            text: Texto a dividir y enviar
+            user_id (int): ID del usuario de Discord
+            user_text (str): Prompt enviado al modelo
+            model_text (str): Respuesta del modelo
         """
-        # Dividir el mensaje en trozos para los embeds (Discord limita a 4096 caracteres por embed)
-        chunks = [text[i : i + 4096] for i in range(0, len(text), 4096)]
-
-        # Enviar cada trozo como un embed separado, rotando colores
-        for i, chunk in enumerate(chunks):
-            # Obtener el color actual para la rotación
-            current_color = BASE_EMBED_COLORS[
-                self.embed_color_index % len(BASE_EMBED_COLORS)
-            ]
-            # Incrementar el índice para el siguiente embed
-            self.embed_color_index += 1
-
-            # Solo el último embed tendrá timestamp y footer
-            if i == len(chunks) - 1:  # Último embed
-                embed = discord.Embed(
-                    description=chunk,
-                    color=current_color,
-                    timestamp=datetime.now(timezone.utc),
-                )
-            else:
-                embed = discord.Embed(description=chunk, color=current_color)
+        try:
+            await append_exchange(user_id, user_text, model_text)
+        except Exception as e:
+            logger.error(
+                f"Error al guardar el intercambio en la BD: {e}", exc_info=True
+            )
 
-            # Solo en el ÚLTIMO embed mostramos el pie con el autor
-            if i == len(chunks) - 1:  # Último embed
-                embed.set_footer(
-                    text=f"Solicitado por {ctx.author.display_name}",
-                    icon_url=ctx.author.avatar.url if ctx.author.avatar else None,
-                )
+    def _schedule_persist(self, user_id: int, user_text: str, model_text: str) -> None:
+        """Lanza _persist_exchange como tarea sin bloquear la respuesta al usuario."""
+        task = asyncio.create_task(
+            self._persist_exchange(user_id, user_text, model_text)
+        )
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
-            await ctx.send(embed=embed)
+    def _next_embed_color(self) -> int:
+        """Devuelve el siguiente color de la rotación de embeds."""
+        color = BASE_EMBED_COLORS[self.embed_color_index % len(BASE_EMBED_COLORS)]
+        self.embed_color_index += 1
+        return color
 
     async def _process_image(self, image_bytes: bytes):
         """
@@ -191,53 +239,52 @@ class ComandoGemini(commands.Cog):
         # Este método es más compatible con diferentes versiones
         return {"mime_type": "image/png", "data": image_bytes}
 
-    async def _run_in_thread(self, func, *args):
+    async def _stream_completion(self, messages: list):
         """
-        Ejecuta una función en un hilo separado y con timeout.
+        Genera los fragmentos de la respuesta de DeepSeek a medida que llegan.
 
-        Args:
-            func: La función a ejecutar
-            args: Argumentos para la función
+        Cada consulta ocupa un lugar del semáforo mientras dura el stream. Si
+        pasan DEEPSEEK_TIMEOUT segundos sin recibir nada se lanza
+        asyncio.TimeoutError y la petición HTTP se cancela de verdad: la
+        conexión vuelve al pool o se cierra, sin dejar hilos colgados.
 
-        Returns:
-            El resultado de la función
+        Args:
+            messages (list): Mensajes en formato OpenAI
 
-        Raises:
-            asyncio.TimeoutError: Si la función tarda más del timeout definido
+        Yields:
+            str: Fragmentos de texto de la respuesta
         """
-        # Usamos loop.run_in_executor para ejecutar la función en un hilo separado
-        loop = asyncio.get_event_loop()
-        retries = 3
-        for attempt in range(retries):
+        async with self._semaphore:
             try:
-                return await asyncio.wait_for(
-                    loop.run_in_executor(self.thread_pool, func, *args),
-                    timeout=DEEPSEEK_TIMEOUT,
+                stream = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=0.9,
+                    max_tokens=2000,
+                    stream=True,
                 )
-            except asyncio.TimeoutError:
-                logger.warning(
-                    f"Timeout al ejecutar función {func.__name__} (intento {attempt + 1}/{retries})"
-                )
-                if attempt < retries - 1:
-                    await asyncio.sleep(2**attempt)  # Espera exponencial
-                else:
-                    raise
-            except Exception as e:
-                error_message = str(e)
-                if (
-                    "429 You exceeded your current quota" in error_message
-                    and attempt < retries - 1
-                ):
-                    logger.warning(
-                        f"Error 429 (Cuota excedida) al ejecutar {func.__name__}. Reintentando en {2**attempt} segundos..."
-                    )
-                    await asyncio.sleep(2**attempt)  # Espera exponencial
-                else:
-                    logger.error(
-                        f"Error inesperado al ejecutar {func.__name__} en un hilo separado: {e}",
-                        exc_info=True,
-                    )
-                    raise
+                async with stream:
+                    chunks = aiter(stream)
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(
+                                anext(chunks), timeout=DEEPSEEK_TIMEOUT
+                            )
+                        except StopAsyncIteration:
+                            return
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+            except APITimeoutError as e:
+                raise asyncio.TimeoutError from e
+
+    async def _close_failed_reply(
+        self, thinking_message: discord.Message, streamer: EmbedStreamer
+    ) -> None:
+        """Cierra la respuesta parcial con un aviso, o borra el mensaje de "pensando"."""
+        if streamer.started:
+            await streamer.finish(note="⚠️ Respuesta interrumpida")
+        else:
+            await thinking_message.delete()
 
     def _prepare_localized_prompt(
         self, prompt: str, lang_code: str, is_image: bool = False
@@ -345,6 +392,15 @@ class ComandoGemini(commands.Cog):
                         )
                         return
 
+        # La respuesta se muestra a medida que llega, reutilizando el mensaje de
+        # "pensando" como primer embed
+        streamer = EmbedStreamer(
+            thinking_message,
+            ctx.send,
+            self._next_embed_color,
+            footer_text=f"Solicitado por {ctx.author.display_name}",
+            footer_icon=ctx.author.avatar.url if ctx.author.avatar else None,
+        )
         try:
             if attached_image:
                 # Si hay una imagen, enviamos el prompt y la imagen al modelo multimodal
@@ -353,55 +409,26 @@ class ComandoGemini(commands.Cog):
                     prompt, lang_code, is_image=True
                 )
 
-                try:
-                    # DeepSeek soporta visión con deepseek-chat
-                    # Convertir imagen a base64 para enviar
-                    import base64
-
-                    image_base64 = base64.b64encode(attached_image["data"]).decode(
-                        "utf-8"
-                    )
-
-                    messages = [
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": localized_prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/png;base64,{image_base64}"
-                                    },
+                # DeepSeek soporta visión con deepseek-chat
+                # Convertir imagen a base64 para enviar
+                import base64
+
+                image_base64 = base64.b64encode(attached_image["data"]).decode("utf-8")
+
+                messages = [
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": localized_prompt},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/png;base64,{image_base64}"
                                 },
-                            ],
-                        }
-                    ]
-
-                    # Ejecutar la solicitud en un hilo separado con timeout
-                    def call_deepseek():
-                        return self.client.chat.completions.create(
-                            model=self.model_name,
-                            messages=messages,
-                            temperature=0.9,
-                            max_tokens=2000,
-                        )
-
-                    response = await self._run_in_thread(call_deepseek)
-
-                    # Guardar el mensaje del usuario en la BD
-                    db_session = get_or_create_gemini_session(ctx.author.id)
-                    add_message_to_session(db_session.id, "user", localized_prompt)
-
-                    # Guardar la respuesta del modelo
-                    response_text = response.choices[0].message.content
-                    add_message_to_session(db_session.id, "model", response_text)
-
-                except asyncio.TimeoutError:
-                    await thinking_message.delete()
-                    await ctx.send(
-                        "La respuesta está tardando demasiado. Por favor, intenta con una consulta más simple o inténtalo más tarde."
-                    )
-                    return
+                            },
+                        ],
+                    }
+                ]
             else:
                 # Si no hay imagen, usamos el chat de texto
                 history = await self._get_user_chat_session(ctx.author.id)
@@ -409,48 +436,46 @@ class ComandoGemini(commands.Cog):
                 # Preparamos el prompt con el idioma solicitado
                 localized_prompt = self._prepare_localized_prompt(prompt, lang_code)
 
-                try:
-                    # Agregar el mensaje del usuario al historial
-                    messages = history + [{"role": "user", "content": localized_prompt}]
-
-                    # Ejecutar la solicitud en un hilo separado con timeout
-                    def call_deepseek():
-                        return self.client.chat.completions.create(
-                            model=self.model_name,
-                            messages=messages,
-                            temperature=0.9,
-                            max_tokens=2000,
-                        )
-
-                    response = await self._run_in_thread(call_deepseek)
+                # Agregar el mensaje del usuario al historial
+                messages = history + [{"role": "user", "content": localized_prompt}]
 
-                    # Guardar mensajes en la BD
-                    db_session = get_or_create_gemini_session(ctx.author.id)
-                    add_message_to_session(db_session.id, "user", localized_prompt)
-                    response_text = response.choices[0].message.content
-                    add_message_to_session(db_session.id, "model", response_text)
-
-                    # Actualizar caché con la nueva respuesta
-                    self.chat_cache[ctx.author.id] = messages + [
-                        {"role": "assistant", "content": response_text}
-                    ]
-
-                except asyncio.TimeoutError:
+            try:
+                async with aclosing(self._stream_completion(messages)) as deltas:
+                    async for delta in deltas:
+                        await streamer.push(delta)
+            except asyncio.TimeoutError:
+                if streamer.started:
+                    await streamer.finish(
+                        note="⚠️ Respuesta incompleta: se agotó el tiempo de espera"
+                    )
+                else:
                     await thinking_message.delete()
                     await ctx.send(
                         "La respuesta está tardando demasiado. Por favor, intenta con una consulta más simple o inténtalo más tarde."
                     )
-                    return
+                return
 
-            # Eliminar el mensaje de "pensando"
-            await thinking_message.delete()
+            # Última edición, con timestamp y pie
+            response_text = await streamer.finish()
+            if not response_text.strip():
+                await thinking_message.delete()
+                await ctx.send(
+                    "DeepSeek no devolvió ninguna respuesta. Por favor, intenta de nuevo."
+                )
+                return
+
+            if not attached_image:
+                # Actualizar caché con la nueva respuesta
+                self.chat_cache[ctx.author.id] = messages + [
+                    {"role": "assistant", "content": response_text}
+                ]
 
-            # Enviar la respuesta usando el nuevo método de embeds coloridos
-            await self._chunk_and_send(ctx, response_text)
+            # Guardar el intercambio en la BD después de responder
+            self._schedule_persist(ctx.author.id, localized_prompt, response_text)
 
         except ValueError as e:
             # Manejar errores específicos de la API
-            await thinking_message.delete()
+            await self._close_failed_reply(thinking_message, streamer)
             error_message = str(e).lower()
 
             if "blocked" in error_message:
@@ -468,7 +493,7 @@ class ComandoGemini(commands.Cog):
             logger.error(
                 f"Error al procesar la solicitud de Gemini: {e}", exc_info=True
             )
-            await thinking_message.delete()
+            await self._close_failed_reply(thinking_message, streamer)
             await ctx.send(
                 "Ha ocurrido un error inesperado al procesar tu consulta. "
                 + f"Por favor, intenta de nuevo más tarde. (Error: {str(e)[:100]})"
@@ -484,7 +509,7 @@ class ComandoGemini(commands.Cog):
             ctx (commands.Context): Contexto del comando
         """
         # Reiniciamos la sesión en BD
-        reset_gemini_session(ctx.author.id)
+        await reset_gemini_session(ctx.author.id)
 
         # Eliminamos la caché
         if ctx.author.id in self.chat_cache:
@@ -2,17 +2,33 @@ import asyncio
 
 import discord
 from discord.ext import commands
-from sqlalchemy.orm import Session
 from table2ascii import PresetStyle
 from table2ascii import table2ascii as t2a
 
 from acciones.gracias import dar_gracias
-from base.database import User, get_db
+from acciones.nick_sync import nickname_syncer
+from base.database import get_thanks_ranking
+from base.leaderboard import thanks_leaderboard
+from config.db_config import LEADERBOARD_RECONCILE_SECONDS
 
 
 class ComandoGracias(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._reconcile_task = None
+
+    async def cog_load(self):
+        # Carga el ranking en memoria y lo reconcilia periódicamente con la BD
+        self._reconcile_task = asyncio.create_task(
+            thanks_leaderboard.run_reconcile(
+                get_thanks_ranking, LEADERBOARD_RECONCILE_SECONDS
+            )
+        )
+
+    async def cog_unload(self):
+        if self._reconcile_task:
+            self._reconcile_task.cancel()
+        await nickname_syncer.stop()
 
     @commands.command(name="gracias")
     async def gracias_comando(self, ctx, member: discord.Member):
@@ -29,18 +45,15 @@ class ComandoGracias(commands.Cog):
             await ctx.send("No puedes agradecerte a ti mismo.")
             return
 
-        db: Session = next(get_db())
-        thanks_count = dar_gracias(db, str(member.id), member.name)
+        thanks_count = await dar_gracias(str(member.id), member.name)
 
         # Enviar el mensaje de agradecimiento y guardar la respuesta en 'response'
         response = await ctx.send(
             f"{member.mention} ha recibido un agradecimiento. Total de agradecimientos: {thanks_count}"
         )
 
-        # Actualizar el nombre de usuario con el ranking
-        copas = thanks_count // 20
-        if copas > 0:
-            await member.edit(nick=f"{member.name} {'🏆' * copas}")
+        # Actualizar el apodo con las copas en segundo plano, solo si cambian
+        nickname_syncer.request(member, thanks_count)
 
         # Borrar los mensajes después de 40 segundos
         await asyncio.sleep(40)
@@ -52,14 +65,16 @@ class ComandoGracias(commands.Cog):
         """
         Muestra el ranking de los usuarios con más agradecimientos.
         """
-        db: Session = next(get_db())
-        users = db.query(User).order_by(User.thanks_count.desc()).limit(10).all()
+        # Sin tocar la BD una vez cargado el ranking en memoria
+        if not thanks_leaderboard.ready:
+            await thanks_leaderboard.refresh(get_thanks_ranking)
+        users = thanks_leaderboard.top(10)
 
         # Crear los datos del ranking para la tabla (usuario y puntaje)
         ranking_data = [["Usuario", "Agradecimientos"]]  # Encabezados de la tabla
 
         for user in users:
-            ranking_data.append([user.username, user.thanks_count])
+            ranking_data.append([user.name, user.score])
 
         # Usar table2ascii para dar formato a la tabla
         table = t2a(
@@ -5,6 +5,7 @@ from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
 from acciones.system_metrics_rust import create_advanced_info_embed
+from base.database import async_pool_monitor, sync_pool_monitor
 
 
 class Info(commands.Cog):
@@ -32,6 +33,16 @@ class Info(commands.Cog):
                 ctx.guild.name if ctx.guild else "OrangePi 5 Plus"
             )
 
+            # Estado del pool de conexiones de la base de datos
+            embed.add_field(
+                name="🗄️ Pool de BD",
+                value=(
+                    f"async: {async_pool_monitor.describe_health()}\n"
+                    f"sync: {sync_pool_monitor.describe_health()}"
+                ),
+                inline=False,
+            )
+
             # Actualizar mensaje con las métricas
             await loading_msg.edit(content=None, embed=embed)
 
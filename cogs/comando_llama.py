@@ -1,20 +1,81 @@
+import asyncio
+import itertools
 import time
+from contextlib import aclosing
 
 from discord.ext import commands
+from table2ascii import PresetStyle
+from table2ascii import table2ascii as t2a
 
 from acciones.llama import (
+    RESPONSE_EMBED_COLORS,
+    URUGUAY_TZ,
     GroqSession,
     groq_handler,
+    metrics_aggregator,
     registrar_metricas_llama,
+    response_cache,
     token_manager,
 )
-from base.database import get_global_metrics, get_user_metrics
+from acciones.streaming import EmbedStreamer
+from base.database import LLAMA_METRIC_FIELDS, get_user_metrics
+from base.llama_rollups import RANGES, get_llama_range_metrics, run_daily_rollups
+
+# Valores que activan las estadísticas globales (compatibles con >llama_stats True)
+_GLOBAL_FLAGS = {"true", "t", "1", "yes", "y", "si", "sí", "on", "global"}
+
+
+def _averages(totals: dict) -> tuple[float, float]:
+    """Tiempo de respuesta y tiempo hasta el primer token promedio, en segundos."""
+    uses = totals["llama_uses"]
+    samples = totals["first_token_count"]
+    avg_time = totals["total_response_time"] / uses if uses else 0
+    avg_first_token = totals["total_first_token_ms"] / samples / 1000 if samples else 0
+    return avg_time, avg_first_token
+
+
+def _format_stats(titulo: str, totals: dict) -> str:
+    """Texto de >llama_stats para un diccionario campo -> total."""
+    totals = {field: int(value or 0) for field, value in totals.items()}
+    avg_time, avg_first_token = _averages(totals)
+    return (
+        f"**{titulo}:**\n"
+        f"Consultas: {totals['llama_uses']}\n"
+        f"Tokens usados: {totals['tokens_used']}\n"
+        f"Tiempo de respuesta promedio: {avg_time:.2f} seg\n"
+        f"Tiempo hasta el primer token promedio: {avg_first_token:.2f} seg\n"
+        f"Fallos de API: {totals['api_failures']}"
+    )
 
 
 class Llama(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.groq_handler = groq_handler
+        self._rollup_task = None
+        # Tabla de >llama_dashboard ya renderizada: (versión de las métricas, texto)
+        self._dashboard_cache: tuple[int, str] | None = None
+
+    async def cog_load(self):
+        # Totales globales y cuotas de tokens de hoy en memoria, sembrados desde la BD
+        await metrics_aggregator.seed()
+        await token_manager.seed()
+        # Respuestas guardadas en la BD que todavía no vencieron
+        await response_cache.seed()
+        # Arranca el volcado periódico de métricas acumuladas en memoria
+        metrics_aggregator.start()
+        # Rollups diarios/semanales/mensuales a la medianoche de Montevideo
+        self._rollup_task = asyncio.create_task(
+            run_daily_rollups(before_rollup=metrics_aggregator.flush)
+        )
+
+    async def cog_unload(self):
+        if self._rollup_task:
+            self._rollup_task.cancel()
+        # Vuelca lo pendiente antes de apagar para no perder métricas
+        await metrics_aggregator.stop()
+        await response_cache.stop()
+        await self.groq_handler.close()
 
     @commands.command(name="llama")
     async def llama(self, ctx, *, user_message: str = ""):
@@ -26,77 +87,108 @@ class Llama(commands.Cog):
 
         thinking_message = await ctx.send("Pythonbot está pensando...")
         start_time = time.monotonic()
-        tokens_usados = (
-            token_manager.tokens_per_request
-        )  # Puedes adaptar esto si usas lógica diferente
-        fue_archivo = False
+        first_token_time = None  # segundos hasta el primer fragmento de la API
+        tokens_usados = 0  # tokens reales informados por la API
         fallo_api = False
+        # La respuesta se muestra a medida que llega, en el mensaje de "pensando"
+        streamer = EmbedStreamer(
+            thinking_message,
+            ctx.send,
+            itertools.cycle(RESPONSE_EMBED_COLORS).__next__,
+            title="Respuesta del Asistente de Python",
+            footer_text=f"Pedido por {ctx.author.display_name}",
+            tz=URUGUAY_TZ,
+        )
+        key = self.groq_handler.cache_key(user_message)
+        cached = response_cache.get(key)
         try:
-            async with GroqSession(token_manager) as allowed:
+            if cached is not None:
+                # Pregunta ya respondida: no llama a Groq ni consume cuota
+                await streamer.push(cached.response)
+                await streamer.finish(note="⚡ Respuesta en caché")
+                return
+            async with GroqSession(token_manager, ctx.author.id) as allowed:
                 if not allowed:
-                    await thinking_message.edit(
-                        content="Se ha alcanzado el límite diario de tokens. Intenta mañana."
-                    )
+                    if token_manager.user_exhausted(ctx.author.id):
+                        aviso = "Alcanzaste tu límite diario de tokens. Intenta mañana."
+                    else:
+                        aviso = "Se ha alcanzado el límite diario de tokens. Intenta mañana."
+                    await thinking_message.edit(content=aviso)
                     return
-                response = await self.groq_handler.get_response(user_message)
-
-                await thinking_message.delete()
+                stream = self.groq_handler.stream_response(user_message)
+                async with aclosing(stream):
+                    async for delta in stream:
+                        if first_token_time is None:
+                            first_token_time = time.monotonic() - start_time
+                        await streamer.push(delta)
+                tokens_usados = stream.tokens
+                token_manager.use_tokens(ctx.author.id, tokens_usados)
 
-                # Usar el nuevo sistema de múltiples embeds para todas las respuestas
-                embeds = self.groq_handler.create_response_embeds(
-                    ctx.author.display_name, response
-                )
-
-                # Enviar cada embed por separado
-                for embed in embeds:
-                    await ctx.send(embed=embed)
+                response = await streamer.finish()
+                if response.strip():
+                    response_cache.put(key, user_message, response, tokens_usados)
+                else:
+                    await thinking_message.edit(
+                        content="No se recibió ninguna respuesta. Intenta de nuevo."
+                    )
         except Exception as e:
             fallo_api = True
-            await thinking_message.edit(
-                content=f"Error al obtener la respuesta: {str(e)}"
-            )
+            if streamer.started:
+                await streamer.finish(note="⚠️ Respuesta interrumpida")
+                await ctx.send(f"Error al obtener la respuesta: {str(e)}")
+            else:
+                await thinking_message.edit(
+                    content=f"Error al obtener la respuesta: {str(e)}"
+                )
         finally:
             response_time = time.monotonic() - start_time
-            await registrar_metricas_llama(
-                str(ctx.author.id), tokens_usados, response_time, fue_archivo, fallo_api
+            registrar_metricas_llama(
+                str(ctx.author.id),
+                tokens_usados,
+                response_time,
+                fallo_api,
+                first_token_time,
             )
 
     @commands.command(name="llama_stats")
-    async def llama_stats(self, ctx, global_stats: bool = False):
-        """Muestra estadísticas del uso de llama (personales o globales). Usa >llama_stats True para global."""
-        if global_stats:
-            result = get_global_metrics()
-            (
-                llama_uses,
-                tokens_used,
-                total_response_time,
-                responses_as_file,
-                api_failures,
-            ) = result
-            avg_time = (total_response_time / llama_uses) if llama_uses else 0
-            msg = (
-                f"**Estadísticas globales de hoy:**\n"
-                f"Consultas: {llama_uses or 0}\n"
-                f"Tokens usados: {tokens_used or 0}\n"
-                f"Tiempo de respuesta promedio: {avg_time:.2f} seg\n"
-                f"Respuestas largas (archivo): {responses_as_file or 0}\n"
-                f"Fallos de API: {api_failures or 0}"
+    async def llama_stats(self, ctx, *opciones: str):
+        """
+        Muestra estadísticas del uso de llama (personales o globales).
+        Uso: >llama_stats [True] [7d|30d]. True muestra las globales; 7d y 30d
+        muestran los últimos días, hoy incluido.
+        """
+        opciones = [opcion.lower() for opcion in opciones]
+        global_stats = any(opcion in _GLOBAL_FLAGS for opcion in opciones)
+        rango = next((opcion for opcion in opciones if opcion in RANGES), None)
+        if rango or not global_stats:
+            # Volcar lo pendiente para que las consultas a la BD estén al día
+            await metrics_aggregator.flush()
+        if rango:
+            result = await get_llama_range_metrics(
+                None if global_stats else str(ctx.author.id), RANGES[rango]
+            )
+            quien = "globales" if global_stats else "tuyas"
+            msg = _format_stats(
+                f"Estadísticas {quien} de los últimos {RANGES[rango]} días",
+                dict(zip(LLAMA_METRIC_FIELDS, result, strict=True)),
+            )
+        elif global_stats:
+            # Totales del día llevados en memoria: no consulta la BD
+            result = metrics_aggregator.today_totals()
+            msg = _format_stats(
+                "Estadísticas globales de hoy",
+                dict(zip(LLAMA_METRIC_FIELDS, result, strict=True)),
             )
         else:
-            metrics = get_user_metrics(str(ctx.author.id))
+            metrics = await get_user_metrics(str(ctx.author.id))
             if metrics:
-                avg_time = (
-                    (metrics.total_response_time / metrics.llama_uses)
-                    if metrics.llama_uses
-                    else 0
+                msg = _format_stats(
+                    "Tus estadísticas de hoy",
+                    {field: getattr(metrics, field) for field in LLAMA_METRIC_FIELDS},
                 )
-                msg = (
-                    f"**Tus estadísticas de hoy:**\n"
-                    f"Consultas: {metrics.llama_uses}\n"
-                    f"Tokens usados: {metrics.tokens_used}\n"
-                    f"Tiempo de respuesta promedio: {avg_time:.2f} seg\n"
-                    f"Respuestas largas (archivo): {metrics.responses_as_file}\n"
-                    f"Fallos de API: {metrics.api_failures}"
+                msg += (
+                    "\nTokens restantes hoy: "
+                    f"{token_manager.remaining(ctx.author.id)[0]}"
                 )
             else:
                 msg = "Aún no tienes estadísticas para hoy."
@@ -105,34 +197,55 @@ class Llama(commands.Cog):
     @commands.command(name="llama_dashboard")
     async def llama_dashboard(self, ctx):
         """Muestra un resumen visual simple de las métricas globales usando table2ascii."""
-        from table2ascii import PresetStyle
-        from table2ascii import table2ascii as t2a
-
-        result = get_global_metrics()
-        (
-            llama_uses,
-            tokens_used,
-            total_response_time,
-            responses_as_file,
-            api_failures,
-        ) = result
-        avg_time = (total_response_time / llama_uses) if llama_uses else 0
+        pending_rows = metrics_aggregator.pending_rows
+        pending_deltas = metrics_aggregator.pending_deltas
+        latency = metrics_aggregator.last_flush_latency
+        flush_info = (
+            f"Write-behind: {pending_rows} filas / {pending_deltas} deltas "
+            "pendientes, último volcado "
+            + (f"{latency * 1000:.1f} ms" if latency is not None else "n/d")
+            + f" ({metrics_aggregator.flush_count} volcados, "
+            f"{metrics_aggregator.failed_flushes} fallidos)"
+        )
+        cache_info = (
+            f"Caché de respuestas: {response_cache.hits} aciertos de "
+            f"{response_cache.hits + response_cache.misses} consultas "
+            f"({response_cache.hit_ratio:.0%}), "
+            f"{len(response_cache)}/{response_cache.maxsize} entradas, "
+            f"{response_cache.evictions} desalojos, "
+            f"{response_cache.expirations} vencidas"
+        )
+        await ctx.send(
+            f"```\n{self._render_dashboard()}\n```\n"
+            f"Métricas globales de hoy para >llama\n{flush_info}\n{cache_info}"
+        )
+
+    def _render_dashboard(self) -> str:
+        """Tabla del dashboard; se vuelve a renderizar solo si cambiaron los totales."""
+        # today_totals() primero: al cambiar el día reinicia y sube la versión
+        result = metrics_aggregator.today_totals()
+        version = metrics_aggregator.version
+        if self._dashboard_cache and self._dashboard_cache[0] == version:
+            return self._dashboard_cache[1]
+        totals = dict(zip(LLAMA_METRIC_FIELDS, result, strict=True))
+        avg_time, avg_first_token = _averages(totals)
         headers = [
             "Consultas",
             "Tokens",
-            "Resp. largas",
             "Errores API",
             "Resp. prom. (seg)",
+            "1er token (seg)",
         ]
         row = [
-            llama_uses or 0,
-            tokens_used or 0,
-            responses_as_file or 0,
-            api_failures or 0,
+            totals["llama_uses"],
+            totals["tokens_used"],
+            totals["api_failures"],
             f"{avg_time:.2f}",
+            f"{avg_first_token:.2f}",
         ]
         tabla = t2a(header=headers, body=[row], style=PresetStyle.thin_compact)
-        await ctx.send(f"```\n{tabla}\n```\nMétricas globales de hoy para >llama")
+        self._dashboard_cache = (version, tabla)
+        return tabla
 
 
 async def setup(bot):
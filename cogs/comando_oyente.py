@@ -9,7 +9,7 @@ import discord
 from discord.ext import commands
 
 from acciones.oyente import direct_keyword_answer, fuzzy_match, fuzzy_suggestions
-from base.database import get_db
+from base.database import sync_session_scope
 
 # Configurar el logger
 logging.basicConfig(level=logging.INFO)
@@ -123,69 +123,66 @@ class OyenteCog(commands.Cog):
             logger.info(f"Respuesta directa por keyword: {user_input}")
             return
 
-        # Obtener sesión de la base de datos usando el contexto de administrador
-        with next(get_db()) as session:
-            try:
+        # Consultar la BD y cerrar la sesión antes de hablar con Discord, para
+        # no retener una conexión del pool mientras se envían los mensajes
+        question = answer = None
+        suggestions = []
+        try:
+            with sync_session_scope() as session:
                 # Buscar la mejor coincidencia usando fuzzy_match (umbral adaptativo)
                 question, answer = fuzzy_match(user_input, session, matched_keywords)
-                logger.debug(f"Matched question: {question}")
-                logger.debug(f"Matched answer: {answer}")
-                if question and answer:
-                    if len(answer) > 80:
-                        embed = discord.Embed(
-                            title="💡 Respuesta a tu pregunta",
-                            description=answer,
-                            color=discord.Color.teal(),
-                        )
-                        embed.set_footer(
-                            text="¿La respuesta fue útil? Reacciona con 👍 o 👎"
-                        )
-                        await message.channel.send(embed=embed, delete_after=40)
-                    else:
-                        await message.channel.send(f"💡 {answer}", delete_after=40)
-                    await message.delete(delay=40)
-                else:
+                if not (question and answer):
                     # Sugerencias inteligentes
                     suggestions = fuzzy_suggestions(
                         user_input, session, matched_keywords, topn=3
                     )
-                    if suggestions:
-                        suggestion_text = "\n".join([f"• {s}" for s in suggestions])
-                        embed = discord.Embed(
-                            title="🤔 ¿Quizás quisiste preguntar...?",
-                            description=f"{suggestion_text}\n\nSi ninguna es lo que buscas, intenta ser más específico o usa `>ayuda`.",
-                            color=discord.Color.blue(),
-                        )
-                        embed.set_footer(
-                            text="¿La sugerencia fue útil? Reacciona con 👍 o 👎"
-                        )
-                        await message.channel.send(embed=embed, delete_after=40)
-                        await message.delete(delay=40)
-                        logger.info(f"Sugerencias ofrecidas: {suggestions}")
-                        # Logging de pregunta no entendida
-                        noent_logger.info(
-                            f"Usuario: {message.author} | Pregunta: '{message.content}' | Sugerencias: {suggestions}"
-                        )
-                    else:
-                        msg = "😕 Ups, no logré entender tu pregunta. Intenta ser más específico o revisa las opciones con `>ayuda`."
-                        await message.channel.send(msg, delete_after=40)
-                        await message.delete(delay=40)
-                        logger.debug(
-                            "No matching question and answer found, ni sugerencias."
-                        )
-                        # Logging de pregunta no entendida
-                        noent_logger.info(
-                            f"Usuario: {message.author} | Pregunta: '{message.content}' | Sugerencias: []"
-                        )
-            except Exception as e:
-                logger.error(f"Error al procesar el mensaje: {e}")
-                await message.channel.send(
-                    "Ocurrió un error al procesar tu pregunta. Por favor, intenta nuevamente más tarde.",
-                    delete_after=40,
+        except Exception as e:
+            logger.error(f"Error al procesar el mensaje: {e}")
+            await message.channel.send(
+                "Ocurrió un error al procesar tu pregunta. Por favor, intenta nuevamente más tarde.",
+                delete_after=40,
+            )
+            await message.delete(delay=40)
+            return
+
+        logger.debug(f"Matched question: {question}")
+        logger.debug(f"Matched answer: {answer}")
+        if question and answer:
+            if len(answer) > 80:
+                embed = discord.Embed(
+                    title="💡 Respuesta a tu pregunta",
+                    description=answer,
+                    color=discord.Color.teal(),
                 )
-                await message.delete(delay=40)
-            finally:
-                session.close()  # Cerrar la sesión de la base de datos
+                embed.set_footer(text="¿La respuesta fue útil? Reacciona con 👍 o 👎")
+                await message.channel.send(embed=embed, delete_after=40)
+            else:
+                await message.channel.send(f"💡 {answer}", delete_after=40)
+            await message.delete(delay=40)
+        elif suggestions:
+            suggestion_text = "\n".join([f"• {s}" for s in suggestions])
+            embed = discord.Embed(
+                title="🤔 ¿Quizás quisiste preguntar...?",
+                description=f"{suggestion_text}\n\nSi ninguna es lo que buscas, intenta ser más específico o usa `>ayuda`.",
+                color=discord.Color.blue(),
+            )
+            embed.set_footer(text="¿La sugerencia fue útil? Reacciona con 👍 o 👎")
+            await message.channel.send(embed=embed, delete_after=40)
+            await message.delete(delay=40)
+            logger.info(f"Sugerencias ofrecidas: {suggestions}")
+            # Logging de pregunta no entendida
+            noent_logger.info(
+                f"Usuario: {message.author} | Pregunta: '{message.content}' | Sugerencias: {suggestions}"
+            )
+        else:
+            msg = "😕 Ups, no logré entender tu pregunta. Intenta ser más específico o revisa las opciones con `>ayuda`."
+            await message.channel.send(msg, delete_after=40)
+            await message.delete(delay=40)
+            logger.debug("No matching question and answer found, ni sugerencias.")
+            # Logging de pregunta no entendida
+            noent_logger.info(
+                f"Usuario: {message.author} | Pregunta: '{message.content}' | Sugerencias: []"
+            )
 
 
 # Función para registrar el cog en el bot
@@ -1,9 +1,13 @@
 import asyncio
+import logging
 
 from discord.ext import commands
 
-from acciones.registrarse import register
-from base.database import User, get_db
+from acciones.registrarse import get_registered, register
+from base.database import register_users_bulk
+from config.db_config import USER_BACKFILL_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
 
 # cogs/comando_register.py
 
@@ -11,40 +15,69 @@ from base.database import User, get_db
 class RegisterCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._backfill_done = False
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """
+        Registra en lote a los miembros de todos los servidores al conectar,
+        para que >gracias y los juegos no encuentren usuarios sin fila.
+        on_ready se repite en cada reconexión; el backfill se hace una vez.
+        """
+        if self._backfill_done:
+            return
+        self._backfill_done = True
+        members = {
+            str(member.id): member.name
+            for guild in self.bot.guilds
+            for member in guild.members
+            if not member.bot
+        }
+        try:
+            nuevos = await register_users_bulk(
+                members.items(), batch_size=USER_BACKFILL_BATCH_SIZE
+            )
+            logger.info(
+                f"Backfill de miembros: {len(members)} revisados, {nuevos} nuevos."
+            )
+        except Exception as e:
+            self._backfill_done = False
+            logger.error(f"Error en el backfill de miembros: {e}", exc_info=True)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        if member.bot:
+            return
+        try:
+            await register(str(member.id), member.name)
+        except Exception as e:
+            logger.error(f"Error al registrar a {member}: {e}")
 
     @commands.command(name="register")
     async def register_user(self, ctx):
         discord_id = str(ctx.author.id)
         username = str(ctx.author.name)
 
-        # Obtener una sesión de la base de datos
-        db = next(get_db())
-
         try:
-            # Verificar si el usuario ya está en la base de datos
-            existing_user = db.query(User).filter(User.discord_id == discord_id).first()
-            if existing_user:
-                mensaje = await ctx.send(f"El usuario {ctx.author} ya está registrado.")
+            # Registrar el usuario; None significa que ya existía
+            user = await register(discord_id, username)
+            if user is None:
+                existente = await get_registered(discord_id)
+                gracias = existente.thanks_count if existente else 0
+                mensaje = await ctx.send(
+                    f"El usuario {ctx.author} ya está registrado "
+                    f"({gracias} agradecimientos)."
+                )
                 await asyncio.sleep(10)
                 await mensaje.delete()
                 await ctx.message.delete()
                 return
 
-            # Registrar el usuario
-            user = await register(discord_id, username)
-
-            # Agregar el usuario a la base de datos
-            db.add(user)
-            db.commit()
-
             mensaje = await ctx.send(
                 f"Usuario {user.username} registrado con ID {user.discord_id}"
             )
         except Exception as e:
-            db.rollback()
             mensaje = await ctx.send(f"Error al registrar el usuario: {e}")
-        finally:
-            db.close()
 
         # Esperar 10 segundos antes de borrar los mensajes
         await asyncio.sleep(30)
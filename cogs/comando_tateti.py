@@ -1,13 +1,30 @@
+import asyncio
+
 from discord.ext import commands
 from tabulate import tabulate
 
 from acciones.tateti import TatetiSetup  # Importar TatetiSetup
-from base.database import TatetiWinner, get_db
+from base.database import get_recent_tateti_winners, get_tateti_ranking
+from base.leaderboard import tateti_leaderboard
+from config.db_config import LEADERBOARD_RECONCILE_SECONDS
 
 
 class TatetiCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._reconcile_task = None
+
+    async def cog_load(self):
+        # Carga el ranking en memoria y lo reconcilia periódicamente con la BD
+        self._reconcile_task = asyncio.create_task(
+            tateti_leaderboard.run_reconcile(
+                get_tateti_ranking, LEADERBOARD_RECONCILE_SECONDS
+            )
+        )
+
+    async def cog_unload(self):
+        if self._reconcile_task:
+            self._reconcile_task.cancel()
 
     @commands.command(name="tateti")
     async def tateti(self, ctx):
@@ -18,44 +35,65 @@ class TatetiCog(commands.Cog):
     @commands.command(name="tateti_ganadores")
     async def tateti_ganadores(self, ctx):
         """Muestra la lista de los últimos 10 ganadores del juego de tateti"""
-        with next(get_db()) as db:
-            try:
-                ganadores = (
-                    db.query(TatetiWinner)
-                    .order_by(TatetiWinner.win_date.desc())
-                    .limit(10)
-                    .all()
-                )
-                if not ganadores:
-                    await ctx.send("No hay ganadores registrados.")
-                    return
-
-                tabla = [
-                    [ganador.username, ganador.discord_id, ganador.win_date]
-                    for ganador in ganadores
-                ]
-                mensaje = "Lista de los últimos 10 ganadores del juego de tateti:\n"
-                mensaje += (
-                    "```"
-                    + tabulate(
-                        tabla,
-                        headers=["Usuario", "ID de Discord", "Fecha"],
-                        tablefmt="grid",
-                    )
-                    + "```"
-                )
-
-                # Dividir el mensaje si es demasiado largo
-                if len(mensaje) > 2000:
-                    partes = [
-                        mensaje[i : i + 2000] for i in range(0, len(mensaje), 2000)
-                    ]
-                    for parte in partes:
-                        await ctx.send(parte)
-                else:
-                    await ctx.send(mensaje)
-            except Exception as e:
-                await ctx.send(f"Error al obtener la lista de ganadores: {e}")
+        # La sesión se cierra dentro del helper, antes de hablar con Discord
+        try:
+            ganadores = await get_recent_tateti_winners(10)
+        except Exception as e:
+            await ctx.send(f"Error al obtener la lista de ganadores: {e}")
+            return
+        if not ganadores:
+            await ctx.send("No hay ganadores registrados.")
+            return
+
+        tabla = [list(ganador) for ganador in ganadores]
+        mensaje = "Lista de los últimos 10 ganadores del juego de tateti:\n"
+        mensaje += (
+            "```"
+            + tabulate(
+                tabla,
+                headers=["Usuario", "ID de Discord", "Fecha"],
+                tablefmt="grid",
+            )
+            + "```"
+        )
+
+        # Dividir el mensaje si es demasiado largo
+        if len(mensaje) > 2000:
+            partes = [mensaje[i : i + 2000] for i in range(0, len(mensaje), 2000)]
+            for parte in partes:
+                await ctx.send(parte)
+        else:
+            await ctx.send(mensaje)
+
+    @commands.command(name="tateti_ranking")
+    async def tateti_ranking(self, ctx):
+        """Muestra los 10 usuarios con más victorias en el tateti"""
+        try:
+            if not tateti_leaderboard.ready:
+                await tateti_leaderboard.refresh(get_tateti_ranking)
+            ranking = tateti_leaderboard.top(10)
+        except Exception as e:
+            await ctx.send(f"Error al obtener el ranking de tateti: {e}")
+            return
+        if not ranking:
+            await ctx.send("No hay ganadores registrados.")
+            return
+
+        tabla = [
+            [posicion, entry.name, entry.score, entry.tiebreak.strftime("%Y-%m-%d")]
+            for posicion, entry in enumerate(ranking, 1)
+        ]
+        mensaje = "Ranking de victorias en el tateti:\n"
+        mensaje += (
+            "```"
+            + tabulate(
+                tabla,
+                headers=["#", "Usuario", "Victorias", "Última"],
+                tablefmt="grid",
+            )
+            + "```"
+        )
+        await ctx.send(mensaje)
 
 
 # Necesario para que el bot cargue este cog
@@ -0,0 +1,63 @@
+"""
+Configuración de la base de datos.
+Todos los valores se pueden ajustar con variables de entorno en el archivo .env.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Retención de mensajes de chat de DeepSeek (tabla gemini_chat_messages)
+# Días sin actividad tras los cuales se purgan los mensajes de una sesión
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", 90))
+# "delete" borra los mensajes; "archive" los mueve a tablas mensuales
+CHAT_RETENTION_MODE = os.getenv("CHAT_RETENTION_MODE", "delete").lower()
+# Filas por transacción, para no mantener bloqueos largos
+CHAT_RETENTION_BATCH_SIZE = int(os.getenv("CHAT_RETENTION_BATCH_SIZE", 500))
+# Cada cuántas horas se ejecuta el trabajo de retención
+CHAT_RETENTION_INTERVAL_HOURS = float(os.getenv("CHAT_RETENTION_INTERVAL_HOURS", 24))
+
+# Instrumentación de consultas
+# Umbral (ms) a partir del cual una consulta se registra como lenta
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+# Repeticiones de la misma consulta en un comando para marcarla como N+1
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", 5))
+
+# Pool de conexiones
+# Registra la pila de quien pide cada conexión (más costoso; solo para depurar)
+DB_POOL_DEBUG = os.getenv("DB_POOL_DEBUG", "false").lower() in ("1", "true", "yes")
+# Segundos que una conexión puede estar prestada antes de avisar de una fuga
+DB_CONNECTION_LEAK_SECONDS = float(os.getenv("DB_CONNECTION_LEAK_SECONDS", 10))
+
+# Ajustes del pool (solo Postgres; SQLite usa su propio pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Segundos de espera por una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Recicla conexiones más viejas que esto (segundos); -1 lo desactiva
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+# Verifica cada conexión al prestarla; evita errores tras reiniciar Postgres
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Tiempo máximo por sentencia en el servidor (ms); 0 lo desactiva
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+# Cada cuántos segundos se registra el estado del pool en el log; 0 lo desactiva
+DB_POOL_HEALTH_INTERVAL = float(os.getenv("DB_POOL_HEALTH_INTERVAL", 300))
+
+# SQLite embebido: se usa cuando DATABASE_URL no está definida
+SQLITE_PATH = os.getenv("SQLITE_PATH", "bot.db")
+# Milisegundos que una conexión espera un bloqueo de escritura antes de fallar
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# NORMAL es seguro con WAL y evita un fsync por commit; FULL para máxima durabilidad
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+# Filas por INSERT al registrar en lote a los miembros de los servidores
+USER_BACKFILL_BATCH_SIZE = int(os.getenv("USER_BACKFILL_BATCH_SIZE", 500))
+
+# Caché en proceso de filas de usuarios (ver base/user_cache.py)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 300))
+
+# Segundos entre reconciliaciones de los rankings en memoria con la base
+LEADERBOARD_RECONCILE_SECONDS = float(os.getenv("LEADERBOARD_RECONCILE_SECONDS", 300))
@@ -0,0 +1,15 @@
+"""
+Configuración de >gracias y de las copas en los apodos.
+Todos los valores se pueden ajustar con variables de entorno en el archivo .env.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Ediciones de apodos permitidas por servidor: ráfaga y segundos de recarga de
+# cada edición (token bucket; Discord limita con dureza las ediciones de miembros)
+NICK_EDIT_BURST = int(os.getenv("NICK_EDIT_BURST", 5))
+NICK_EDIT_REFILL_SECONDS = float(os.getenv("NICK_EDIT_REFILL_SECONDS", 2.0))
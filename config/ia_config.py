@@ -3,6 +3,12 @@ Configuración para los modelos de IA DeepSeek.
 Este módulo contiene todas las configuraciones necesarias para los modelos de texto e imagen.
 """
 
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
 # Configuración para generación de texto
 text_generation_config: dict = {
     "temperature": 0.9,  # Controla la creatividad de las respuestas
@@ -71,6 +77,12 @@ LANGUAGE_MAP = {
 
 # Tiempo máximo de espera para respuestas de DeepSeek (en segundos)
 DEEPSEEK_TIMEOUT = 60.0
+# Consultas simultáneas a DeepSeek; también es el tamaño del pool de conexiones
+DEEPSEEK_MAX_CONCURRENCY = int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", 5))
+# Tiempo máximo para abrir la conexión HTTP (en segundos)
+DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", 10))
+# Segundos que una conexión ociosa se mantiene abierta para reutilizarla
+DEEPSEEK_KEEPALIVE_SECONDS = float(os.getenv("DEEPSEEK_KEEPALIVE_SECONDS", 60))
 
 # Colores para embeds
 EMBED_COLORS = {
@@ -7,6 +7,27 @@ load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL")
 TEMPERATURE = float(os.getenv("TEMPERATURE", 0.7))
+# Cada cuántos segundos se vuelcan a la BD las métricas acumuladas en memoria
+LLAMA_METRICS_FLUSH_INTERVAL = float(os.getenv("LLAMA_METRICS_FLUSH_INTERVAL", 10))
+# Cuotas diarias de tokens reales (prompt + completion), por usuario y del bot
+LLAMA_USER_DAILY_TOKENS = int(os.getenv("LLAMA_USER_DAILY_TOKENS", 20000))
+LLAMA_GLOBAL_DAILY_TOKENS = int(os.getenv("LLAMA_GLOBAL_DAILY_TOKENS", 100000))
+# Tokens que se reservan de la cuota mientras una consulta está en curso
+LLAMA_TOKEN_RESERVE = int(os.getenv("LLAMA_TOKEN_RESERVE", 1000))
+# Consultas simultáneas a Groq; también es el tamaño del pool de conexiones
+LLAMA_MAX_CONCURRENCY = int(os.getenv("LLAMA_MAX_CONCURRENCY", 4))
+# Tiempos máximos de conexión y de espera entre datos de Groq (en segundos)
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", 10))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", 60))
+# Caché de respuestas por pregunta normalizada: entradas, vida (segundos) y si
+# se guarda en la BD para sobrevivir reinicios
+LLAMA_RESPONSE_CACHE_SIZE = int(os.getenv("LLAMA_RESPONSE_CACHE_SIZE", 500))
+LLAMA_RESPONSE_CACHE_TTL = float(os.getenv("LLAMA_RESPONSE_CACHE_TTL", 86400))
+LLAMA_RESPONSE_CACHE_PERSIST = os.getenv(
+    "LLAMA_RESPONSE_CACHE_PERSIST", "true"
+).lower() in ("1", "true", "yes")
+# Segundos que una conexión ociosa se mantiene abierta para reutilizarla
+GROQ_KEEPALIVE_SECONDS = float(os.getenv("GROQ_KEEPALIVE_SECONDS", 60))
 
 if not GROQ_API_KEY or not GROQ_MODEL:
     raise ValueError(
@@ -1,13 +1,14 @@
 import asyncio
 import logging
 import os
+import signal
 import sys
 
 import discord
 from discord.ext.commands import Bot
 from dotenv import load_dotenv
 
-from base.database import init_db  # Importar la función init_db
+from base import query_stats
 
 # DeepSeek se configura en el cog correspondiente
 
@@ -42,8 +43,7 @@ bot = Bot(
     case_insensitive=True,
 )
 
-# Inicializar la base de datos
-init_db()
+# El esquema y los datos iniciales se crean con `python -m base.manage init`
 
 
 async def load_cogs(bot):
@@ -67,6 +67,17 @@ async def on_ready():
     )
 
 
+@bot.before_invoke
+async def before_any_command(ctx):
+    """Abre el ámbito de medición de consultas del comando (detección de N+1)."""
+    query_stats.start_command(ctx.command.qualified_name)
+
+
+@bot.after_invoke
+async def after_any_command(ctx):
+    query_stats.end_command()
+
+
 @bot.event
 async def on_disconnect():
     """Evento que se ejecuta cuando el bot se desconecta."""
@@ -79,18 +90,45 @@ async def on_resumed():
     logger.info("Bot resumed session successfully.")
 
 
+async def shutdown(sig):
+    """
+    Cierra el bot al recibir SIGTERM/SIGINT (docker stop, Ctrl+C).
+
+    bot.close() descarga las extensiones, así que cada cog_unload vuelca lo
+    que tenga pendiente (métricas de llama, cuotas de tokens) antes de salir.
+    """
+    logger.info(f"Received {sig.name}, shutting down...")
+    await bot.close()
+
+
 async def main():
     """Función principal que arranca el bot y maneja la reconexión."""
-    while True:
+    loop = asyncio.get_running_loop()
+    shutdown_tasks = set()  # referencia para que el GC no recoja la tarea
+    for sig in (signal.SIGTERM, signal.SIGINT):
         try:
-            await load_cogs(bot)
-            await bot.start(token)
-        except discord.DiscordException as e:
-            logger.error(f"Discord exception in main loop: {e}")
-            await asyncio.sleep(5)  # Esperar 5 segundos antes de intentar reconectar
-        except Exception as e:
-            logger.error(f"Unexpected error in main loop: {e}")
-            await asyncio.sleep(5)  # Esperar 5 segundos antes de intentar reconectar
+            loop.add_signal_handler(
+                sig,
+                lambda sig=sig: shutdown_tasks.add(asyncio.create_task(shutdown(sig))),
+            )
+        except NotImplementedError:
+            # Windows no soporta add_signal_handler; Ctrl+C sigue cerrando vía async with
+            pass
+
+    # async with cierra el bot (y descarga los cogs) al salir por cualquier motivo
+    async with bot:
+        await load_cogs(bot)
+        while not bot.is_closed():
+            try:
+                await bot.start(token)
+            except discord.DiscordException as e:
+                logger.error(f"Discord exception in main loop: {e}")
+                # Esperar 5 segundos antes de intentar reconectar
+                await asyncio.sleep(5)
+            except Exception as e:
+                logger.error(f"Unexpected error in main loop: {e}")
+                # Esperar 5 segundos antes de intentar reconectar
+                await asyncio.sleep(5)
 
 
 if __name__ == "__main__":
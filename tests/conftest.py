@@ -0,0 +1,39 @@
+"""
+Fixtures comunes: los helpers de base.database corren contra un archivo
+SQLite temporal (sqlite+aiosqlite), sin Postgres ni variables de entorno.
+"""
+
+import os
+import tempfile
+
+# Antes de importar base.database, que crea los motores al importarse
+_DB_DIR = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+# config.lla_config exige credenciales de Groq; los tests nunca llaman a la API
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("GROQ_MODEL", "test-model")
+
+import pytest  # noqa: E402
+
+from base import database  # noqa: E402
+from base.user_cache import user_cache  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    database.init_db()
+    yield
+    database.engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+async def clean_db():
+    """Tablas y caché vacías; el pool async se descarta al terminar cada test."""
+    with database.engine.begin() as conn:
+        for table in reversed(database.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    user_cache.clear()
+    yield
+    # Las conexiones de aiosqlite quedan ligadas al event loop de cada test
+    await database.async_engine.dispose()
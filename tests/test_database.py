@@ -0,0 +1,84 @@
+"""Helpers async de base.database contra SQLite (aiosqlite)."""
+
+from base.database import (
+    LLAMA_METRIC_FIELDS,
+    append_exchange,
+    get_global_metrics,
+    get_recent_history,
+    get_tateti_ranking,
+    increment_thanks,
+    record_tateti_win,
+    register_user,
+    today_uy,
+    upsert_llama_metrics_batch,
+    utcnow,
+)
+
+
+def _metrics_row(user_id, **deltas):
+    row = {"date": today_uy(), "user_id": user_id}
+    row.update({field: deltas.get(field, 0) for field in LLAMA_METRIC_FIELDS})
+    return row
+
+
+async def test_upsert_llama_metrics_batch_sums_deltas():
+    await upsert_llama_metrics_batch(
+        [
+            _metrics_row("1", llama_uses=1, tokens_used=100),
+            _metrics_row("2", llama_uses=2, tokens_used=50, api_failures=1),
+        ]
+    )
+    # El mismo (date, user_id) otra vez suma sobre la fila existente
+    await upsert_llama_metrics_batch([_metrics_row("1", llama_uses=3, tokens_used=7)])
+
+    totals = dict(zip(LLAMA_METRIC_FIELDS, await get_global_metrics(), strict=True))
+    assert totals["llama_uses"] == 6
+    assert totals["tokens_used"] == 157
+    assert totals["api_failures"] == 1
+
+
+async def test_upsert_llama_metrics_batch_empty_is_noop():
+    await upsert_llama_metrics_batch([])
+    assert all(value is None for value in await get_global_metrics())
+
+
+async def test_append_exchange_and_recent_history():
+    assert await get_recent_history("42") == []
+
+    session_id = await append_exchange("42", "hola", "¡hola!")
+    assert await append_exchange("42", "¿qué es un decorador?", "Una función...") == (
+        session_id
+    )
+
+    assert await get_recent_history("42") == [
+        ("user", "hola"),
+        ("model", "¡hola!"),
+        ("user", "¿qué es un decorador?"),
+        ("model", "Una función..."),
+    ]
+    # limit devuelve los más recientes, en orden cronológico
+    assert await get_recent_history("42", limit=2) == [
+        ("user", "¿qué es un decorador?"),
+        ("model", "Una función..."),
+    ]
+    assert await get_recent_history("43") == []
+
+
+async def test_increment_thanks_creates_and_increments():
+    assert await increment_thanks("7", "ana") == 1
+    assert await increment_thanks("7", "ana") == 2
+    # El usuario creado por >gracias ya cuenta como registrado
+    assert await register_user("7", "ana") is None
+
+
+async def test_record_tateti_win_updates_ranking():
+    assert await record_tateti_win("1", "ana") == 1
+    assert await record_tateti_win("2", "beto") == 1
+    assert await record_tateti_win("2", "beto") == 2
+
+    ranking = await get_tateti_ranking()
+    assert [(row[0], row[1], row[2]) for row in ranking] == [
+        ("2", "beto", 2),
+        ("1", "ana", 1),
+    ]
+    assert ranking[0][3] <= utcnow()
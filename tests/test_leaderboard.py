@@ -0,0 +1,59 @@
+"""Rankings top-K en memoria (base/leaderboard.py)."""
+
+from base.database import User, get_thanks_ranking, increment_thanks, sync_session_scope
+from base.leaderboard import Leaderboard
+
+
+async def test_thanks_ranking_with_null_count():
+    # Usuarios viejos pueden tener thanks_count NULL
+    with sync_session_scope() as session:
+        session.add(User(discord_id="1", username="viejo", thanks_count=None))
+    await increment_thanks("2", "ana")
+
+    rows = await get_thanks_ranking(1)
+    assert [row[0] for row in rows] == ["2"]
+
+    board = Leaderboard("gracias")
+    board.reconcile(await get_thanks_ranking(10))
+    assert [(entry.key, entry.score) for entry in board.top()] == [("2", 1), ("1", 0)]
+
+
+def test_update_ignores_lower_totals():
+    board = Leaderboard("gracias")
+    board.update("1", "ana", 5)
+    board.update("1", "ana", 3)  # llegó desordenado
+    assert board.top() == [("1", "ana", 5, 0)]
+
+
+def test_update_keeps_only_capacity_best():
+    board = Leaderboard("gracias", capacity=2)
+    board.update("1", "ana", 5)
+    board.update("2", "beto", 3)
+    board.update("3", "caro", 1)  # no supera al último
+    assert [entry.key for entry in board.top()] == ["1", "2"]
+    board.update("3", "caro", 4)
+    assert [entry.key for entry in board.top()] == ["1", "3"]
+
+
+def test_reconcile_keeps_updates_newer_than_the_query():
+    board = Leaderboard("gracias", capacity=3)
+    board.update("1", "ana", 5)
+    board.update("2", "beto", 3)
+    since = board.version
+    # Mientras corre la consulta, "2" recibe un agradecimiento
+    board.update("2", "beto", 4)
+
+    changed = board.reconcile(
+        [("1", "ana", 6), ("2", "beto", 3), ("9", "zoe", 2)], since
+    )
+    assert [(entry.key, entry.score) for entry in board.top()] == [
+        ("1", 6),
+        ("2", 4),
+        ("9", 2),
+    ]
+    assert changed == 2
+    assert board.ready
+
+    # Sin `since` la base manda, incluso para bajas
+    assert board.reconcile([("1", "ana", 6)]) == 2
+    assert [entry.key for entry in board.top()] == ["1"]
@@ -0,0 +1,50 @@
+"""Rollups y rangos de métricas de >llama (base/llama_rollups.py)."""
+
+from datetime import date, timedelta
+
+from base.database import LLAMA_METRIC_FIELDS, today_uy, upsert_llama_metrics_batch
+from base.llama_rollups import (
+    get_llama_range_metrics,
+    pending_rollup_days,
+    range_periods,
+    rollup_llama_days,
+)
+
+
+def test_range_periods_uses_months_and_weeks():
+    # 2024-09-28 (sábado) .. 2024-11-10 (domingo)
+    periods = range_periods(date(2024, 9, 28), date(2024, 11, 10))
+    assert periods["month"] == [date(2024, 10, 1)]
+    assert periods["week"] == [date(2024, 11, 4)]
+    assert periods["day"] == [
+        date(2024, 9, 28),
+        date(2024, 9, 29),
+        date(2024, 9, 30),
+        date(2024, 11, 1),
+        date(2024, 11, 2),
+        date(2024, 11, 3),
+    ]
+
+
+def _row(day, user_id, uses):
+    row = {"date": day, "user_id": user_id}
+    row.update(dict.fromkeys(LLAMA_METRIC_FIELDS, 0))
+    row["llama_uses"] = uses
+    return row
+
+
+async def test_range_metrics_match_raw_totals():
+    today = today_uy()
+    # Un uso por día durante 40 días para "1", y dos por día para "2"
+    for offset in range(40):
+        day = today - timedelta(days=offset)
+        await upsert_llama_metrics_batch([_row(day, "1", 1), _row(day, "2", 2)])
+    await rollup_llama_days(await pending_rollup_days())
+
+    uses = LLAMA_METRIC_FIELDS.index("llama_uses")
+    for days in (7, 30):
+        assert (await get_llama_range_metrics("1", days))[uses] == days
+        assert (await get_llama_range_metrics(None, days))[uses] == 3 * days
+    # Repetir el rollup es inocuo
+    await rollup_llama_days([today - timedelta(days=1)])
+    assert (await get_llama_range_metrics(None, 30))[uses] == 90
@@ -0,0 +1,74 @@
+"""Agregador write-behind de métricas de >llama (base/metrics_aggregator.py)."""
+
+import pytest
+
+from base import metrics_aggregator
+from base.database import LLAMA_METRIC_FIELDS, get_global_metrics
+from base.metrics_aggregator import LlamaMetricsAggregator
+
+
+def _totals(values) -> dict:
+    return {
+        field: int(value or 0)
+        for field, value in zip(LLAMA_METRIC_FIELDS, values, strict=True)
+    }
+
+
+async def test_flush_upserts_pending_rows():
+    aggregator = LlamaMetricsAggregator()
+    aggregator.record("1", llama_uses=1, tokens_used=100)
+    aggregator.record("1", llama_uses=1, tokens_used=50)
+    aggregator.record("2", llama_uses=1, api_failures=1)
+    assert aggregator.pending_rows == 2
+
+    assert await aggregator.flush() == 2
+    assert aggregator.pending_rows == 0
+    assert aggregator.pending_deltas == 0
+
+    # Un segundo volcado suma sobre las filas existentes
+    aggregator.record("1", tokens_used=25)
+    assert await aggregator.flush() == 1
+    assert await aggregator.flush() == 0
+
+    totals = _totals(await get_global_metrics())
+    assert totals["llama_uses"] == 3
+    assert totals["tokens_used"] == 175
+    assert totals["api_failures"] == 1
+    assert _totals(aggregator.today_totals()) == totals
+
+
+async def test_failed_flush_keeps_pending_deltas(monkeypatch):
+    aggregator = LlamaMetricsAggregator()
+    aggregator.record("1", llama_uses=1, tokens_used=10)
+
+    async def broken(rows):
+        raise RuntimeError("sin conexión")
+
+    monkeypatch.setattr(metrics_aggregator, "upsert_llama_metrics_batch", broken)
+    with pytest.raises(RuntimeError):
+        await aggregator.flush()
+    assert aggregator.failed_flushes == 1
+    assert aggregator.pending_deltas == 2
+
+    # Lo registrado durante la falla se suma a lo reincorporado
+    aggregator.record("1", tokens_used=5)
+    monkeypatch.undo()
+    assert await aggregator.flush() == 1
+    assert _totals(await get_global_metrics())["tokens_used"] == 15
+
+
+async def test_seed_adds_pending_to_persisted_totals():
+    writer = LlamaMetricsAggregator()
+    writer.record("1", llama_uses=2)
+    await writer.flush()
+
+    aggregator = LlamaMetricsAggregator()
+    aggregator.record("2", llama_uses=1)
+    await aggregator.seed()
+    assert _totals(aggregator.today_totals())["llama_uses"] == 3
+
+
+def test_record_rejects_unknown_field():
+    aggregator = LlamaMetricsAggregator()
+    with pytest.raises(ValueError):
+        aggregator.record("1", bogus=1)
@@ -0,0 +1,73 @@
+"""Apodos con copas de >gracias (acciones/nick_sync.py)."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from acciones.nick_sync import TROPHY, NicknameSyncer
+
+
+class FakeMember:
+    """Lo mínimo de discord.Member que usa NicknameSyncer."""
+
+    def __init__(self, member_id: int, guild_id: int = 1, nick: str | None = None):
+        self.id = member_id
+        self.guild = SimpleNamespace(id=guild_id)
+        self.name = f"miembro{member_id}"
+        self.nick = nick
+        self.edits: list[tuple[float, str]] = []
+
+    async def edit(self, nick: str) -> None:
+        self.edits.append((time.monotonic(), nick))
+        self.nick = nick
+
+
+async def _drain(syncer: NicknameSyncer) -> None:
+    await asyncio.gather(*syncer._workers.values())
+
+
+async def test_skips_when_tier_is_unchanged():
+    syncer = NicknameSyncer(burst=5, refill_seconds=0.01)
+    member = FakeMember(1, nick=f"miembro1 {TROPHY}")
+    assert not syncer.request(member, 19)  # sin copas
+    assert not syncer.request(member, 25)  # ya muestra una copa
+    assert syncer.request(member, 40)
+    await _drain(syncer)
+
+    assert [nick for _, nick in member.edits] == [f"miembro1 {TROPHY * 2}"]
+    assert not syncer.request(member, 41)
+    assert (syncer.edits, syncer.skipped) == (1, 3)
+
+
+async def test_bursts_for_one_member_are_coalesced():
+    syncer = NicknameSyncer(burst=1, refill_seconds=0.05)
+    busy, other = FakeMember(1), FakeMember(2)
+    # El primer pedido consume el único token; el resto espera en la cola
+    syncer.request(other, 20)
+    for count in (20, 40, 60):
+        syncer.request(busy, count)
+    await _drain(syncer)
+
+    assert [nick for _, nick in busy.edits] == [f"miembro1 {TROPHY * 3}"]
+    assert syncer.coalesced == 2
+    assert syncer.edits == 2
+
+
+async def test_edits_are_rate_limited_per_guild():
+    refill = 0.05
+    syncer = NicknameSyncer(burst=2, refill_seconds=refill)
+    members = [FakeMember(i) for i in range(4)]
+    elsewhere = FakeMember(9, guild_id=2)
+    start = time.monotonic()
+    for member in [*members, elsewhere]:
+        syncer.request(member, 20)
+    await _drain(syncer)
+
+    times = [member.edits[0][0] - start for member in members]
+    # Dos ediciones de inmediato y luego una por cada recarga del bucket
+    assert times[1] < refill
+    assert times[2] >= refill * 0.9
+    assert times[3] >= refill * 1.9
+    # Otro servidor tiene su propio bucket
+    assert elsewhere.edits[0][0] - start < refill
+    assert syncer.edits == 5
@@ -0,0 +1,58 @@
+"""Métricas del pool de conexiones (base/pool_monitor.py)."""
+
+import asyncio
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from base.pool_monitor import PoolMonitor
+
+
+def test_checkout_without_contention_is_not_a_wait(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool, pool_size=2
+    )
+    monitor = PoolMonitor("test")
+    monitor.attach(engine)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert (monitor.checkouts, monitor.checkins) == (1, 1)
+    assert monitor.waits == 0
+    assert monitor.max_waiters == 0
+    engine.dispose()
+
+
+async def test_waits_only_counted_when_pool_is_exhausted(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+    monitor = PoolMonitor("test")
+    monitor.attach(engine.sync_engine)
+
+    async def hold(seconds):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await asyncio.sleep(seconds)
+
+    first = asyncio.create_task(hold(0.1))
+    await asyncio.sleep(0.02)  # el primero ya tiene la única conexión
+    await hold(0)
+    await first
+
+    assert monitor.waits == 1
+    assert monitor.max_waiters == 1
+    assert monitor.waiters == 0
+    assert monitor.max_wait > 0.03
+
+    # dispose() crea un pool nuevo, que también se mide
+    await engine.dispose()
+    first = asyncio.create_task(hold(0.05))
+    await asyncio.sleep(0.02)
+    await hold(0)
+    await first
+    assert monitor.waits == 2
+    await engine.dispose()
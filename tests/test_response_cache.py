@@ -0,0 +1,75 @@
+"""Caché de respuestas de >llama (base/response_cache.py)."""
+
+from datetime import timedelta
+
+from base import response_cache
+from base.database import (
+    load_llama_response_cache,
+    save_llama_response,
+    utcnow,
+)
+from base.response_cache import ResponseCache, cache_key, normalize_question
+
+
+async def test_save_prunes_table_to_maxsize_and_ttl():
+    now = utcnow()
+    # Una vencida y cinco vigentes, de la más vieja a la más nueva
+    await save_llama_response("old", "q", "r", 1, now - timedelta(hours=2), 10, 3600)
+    for i in range(5):
+        created = now - timedelta(minutes=10 - i)
+        await save_llama_response(f"k{i}", "q", "r", 1, created, 3, 3600)
+
+    rows = await load_llama_response_cache(10, 3600)
+    assert [row.key for row in rows] == ["k4", "k3", "k2"]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(maxsize=2, ttl=60)
+    cache.put("a", "qa", "ra")
+    cache.put("b", "qb", "rb")
+    assert cache.get("a").response == "ra"  # "b" pasa a ser la menos usada
+    cache.put("c", "qc", "rc")
+
+    assert cache.get("b") is None
+    assert [cache.get(key).response for key in ("a", "c")] == ["ra", "rc"]
+    assert cache.evictions == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_ratio == 0.75
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: clock[0])
+    cache = ResponseCache(maxsize=10, ttl=60)
+    cache.put("a", "q", "r", tokens=7)
+    clock[0] += 59
+    assert cache.get("a") == ("r", 7)
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_blank_responses_are_not_cached():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    cache.put("a", "q", "  \n")
+    assert len(cache) == 0
+
+
+def test_equivalent_questions_share_a_key():
+    key = cache_key("¿Qué es un decorador?", "modelo", 0.7)
+    assert cache_key("  que es   un DECORADOR ", "modelo", 0.7) == key
+    assert cache_key("que es un decorador", "otro", 0.7) != key
+    assert normalize_question("¿Qué  es\tx[0]?") == "que es x[0]"
+
+
+async def test_seed_restores_persisted_responses():
+    cache = ResponseCache(maxsize=10, ttl=3600, persist=True)
+    cache.put("a", "qa", "ra", tokens=3)
+    cache.put("b", "qb", "rb", tokens=4)
+    await cache.stop()
+
+    restored = ResponseCache(maxsize=10, ttl=3600, persist=True)
+    assert await restored.seed() == 2
+    assert restored.get("a") == ("ra", 3)
+    assert restored.get("b") == ("rb", 4)
@@ -0,0 +1,78 @@
+"""Retención de mensajes de chat (base/retention.py)."""
+
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from base.database import (
+    GeminiChatHistory,
+    GeminiChatMessage,
+    GeminiChatSession,
+    sync_session_scope,
+    utcnow,
+)
+from base.retention import _archive_table, purge_inactive_chat_messages
+
+
+def _add_session(user_id: str, last_updated, contents) -> int:
+    with sync_session_scope() as session:
+        chat = GeminiChatSession(discord_user_id=user_id, last_updated=last_updated)
+        session.add(chat)
+        session.flush()
+        for content in contents:
+            message = GeminiChatMessage(
+                session_id=chat.id, role="user", content=content, timestamp=last_updated
+            )
+            session.add(message)
+            session.flush()
+            session.add(
+                GeminiChatHistory(
+                    discord_user_id=user_id,
+                    chat_session_id=chat.id,
+                    message_id=message.id,
+                )
+            )
+        # onupdate pisaría last_updated al agregar los mensajes
+        chat.last_updated = last_updated
+        return chat.id
+
+
+def _count(model) -> int:
+    with sync_session_scope() as session:
+        return session.scalar(select(func.count()).select_from(model))
+
+
+async def test_delete_mode_purges_stale_sessions_in_batches():
+    now = utcnow()
+    _add_session("1", now - timedelta(days=100), ["hola", "qué tal", "ñandú"])
+    fresh = _add_session("2", now - timedelta(days=1), ["sigo acá"])
+
+    report = await purge_inactive_chat_messages(90, batch_size=2, pause=0)
+
+    assert report["messages"] == 3
+    assert report["history_rows"] == 3
+    assert report["sessions"] == 1
+    assert report["bytes"] == len("holaqué talñandú".encode())
+    assert report["batches"] == 3  # dos lotes de mensajes y uno de sesiones
+    with sync_session_scope() as session:
+        assert session.scalars(select(GeminiChatSession.id)).all() == [fresh]
+    assert _count(GeminiChatMessage) == 1
+    assert _count(GeminiChatHistory) == 1
+
+
+async def test_archive_mode_copies_messages_before_deleting():
+    old = utcnow() - timedelta(days=100)
+    _add_session("1", old, ["uno", "dos"])
+
+    report = await purge_inactive_chat_messages(90, mode="archive", pause=0)
+
+    assert report["mode"] == "archive"
+    assert report["messages"] == 2
+    assert _count(GeminiChatMessage) == 0
+    archive = _archive_table(old.year, old.month)
+    with sync_session_scope() as session:
+        rows = session.execute(
+            select(archive.c.discord_user_id, archive.c.content).order_by(archive.c.id)
+        ).all()
+        session.execute(archive.delete())
+    assert [tuple(row) for row in rows] == [("1", "uno"), ("1", "dos")]
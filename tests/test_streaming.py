@@ -0,0 +1,72 @@
+"""Respuestas en streaming sobre embeds (acciones/streaming.py)."""
+
+from acciones.streaming import EmbedStreamer
+
+
+class FakeMessage:
+    def __init__(self, log):
+        self.log = log
+        self.embed = None
+
+    async def edit(self, content=None, embed=None):
+        self.embed = embed
+        self.log.append(("edit", self, embed))
+
+
+def _streamer(page_size=10, edit_interval=0.0):
+    log = []
+
+    async def send(embed):
+        message = FakeMessage(log)
+        message.embed = embed
+        log.append(("send", message, embed))
+        return message
+
+    streamer = EmbedStreamer(
+        FakeMessage(log),
+        send,
+        lambda: 0x00FF00,
+        title="T",
+        footer_text="F",
+        edit_interval=edit_interval,
+        page_size=page_size,
+    )
+    return streamer, log
+
+
+async def test_pages_roll_over_and_only_last_has_footer():
+    streamer, log = _streamer()
+    await streamer.push("a" * 15)
+    text = await streamer.finish()
+
+    assert text == "a" * 15
+    sends = [message for action, message, _ in log if action == "send"]
+    assert len(sends) == 1
+    first, last = log[0][1], sends[0]
+    assert first.embed.description == "a" * 10
+    assert first.embed.footer.text is None
+    assert last.embed.description == "a" * 5
+    assert last.embed.footer.text == "F"
+    assert last.embed.title is None
+
+
+async def test_edits_are_throttled():
+    streamer, log = _streamer(page_size=100, edit_interval=60)
+    for _ in range(5):
+        await streamer.push("x")
+    assert streamer.edits == 1  # solo el primer fragmento, enseguida
+    await streamer.finish()
+    assert log[-1][2].description == "xxxxx"
+
+
+async def test_blank_tail_page_finalizes_previous_page():
+    streamer, log = _streamer()
+    await streamer.push("a" * 10)
+    await streamer.push("   ")
+    await streamer.finish(note="⚠️ Respuesta interrumpida")
+
+    assert all(action == "edit" for action, _, _ in log)
+    final = log[-1][2]
+    assert final.description == "a" * 10
+    assert final.footer.text == "⚠️ Respuesta interrumpida · F"
+    assert final.timestamp is not None
@@ -0,0 +1,59 @@
+"""Cuotas de tokens de >llama (acciones/llama.py)."""
+
+import pytest
+
+from acciones.llama import GroqSession, TokenManager
+
+
+def test_reserve_counts_against_limits():
+    manager = TokenManager(user_daily_limit=1000, global_daily_limit=1500)
+    assert manager.reserve("1", 600)
+    assert manager.reserve("1", 600)
+    # El usuario 1 ya tiene 1200 apartados: supera su cuota
+    assert not manager.reserve("1", 1)
+    assert manager.reserve("2", 300)
+    # Entre ambos ya hay 1500 apartados: se agotó la cuota global
+    assert not manager.reserve("3", 1)
+    assert manager.remaining("3") == (1000, 0)
+
+    manager.release("1", 600)
+    manager.release("1", 600)
+    assert manager.reserved_by_user == {"2": 300}
+    assert manager.reserved_total == 300
+    assert manager.reserve("1", 1)
+
+
+def test_release_does_not_go_negative():
+    manager = TokenManager()
+    manager.reserve("1", 100)
+    manager.release("1", 500)
+    assert manager.reserved_by_user == {}
+    assert manager.reserved_total == 0
+
+
+def test_used_tokens_and_reservations_share_the_quota():
+    manager = TokenManager(user_daily_limit=1000, global_daily_limit=10000)
+    manager.use_tokens("1", 900)
+    assert manager.reserve("1", 200)
+    assert manager.user_exhausted("1")
+    manager.release("1", 200)
+    assert not manager.user_exhausted("1")
+
+
+async def test_concurrent_sessions_cannot_share_the_last_quota():
+    manager = TokenManager(user_daily_limit=1000, global_daily_limit=10000)
+    async with GroqSession(manager, "1", estimate=1000) as first:
+        async with GroqSession(manager, "1", estimate=1000) as second:
+            assert first and not second
+    assert manager.reserved_total == 0
+
+
+async def test_session_releases_on_error():
+    manager = TokenManager()
+    with pytest.raises(RuntimeError):
+        async with GroqSession(manager, "1", estimate=500) as allowed:
+            assert allowed
+            manager.use_tokens("1", 120)
+            raise RuntimeError("falló Groq")
+    assert manager.reserved_total == 0
+    assert manager.used_by_user == {"1": 120}
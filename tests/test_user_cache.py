@@ -0,0 +1,43 @@
+"""Caché de filas de usuarios (base/user_cache.py) y sus helpers de la BD."""
+
+from base.database import get_user, increment_thanks, register_user
+from base.user_cache import CachedUser, UserCache, user_cache
+
+
+def test_lru_eviction_and_ttl_expiration():
+    cache = UserCache(maxsize=2, ttl=60)
+    for i in range(3):
+        cache.put(CachedUser(str(i), f"u{i}", 0))
+    assert cache.get("0") is None
+    assert cache.evictions == 1
+
+    expired = UserCache(maxsize=2, ttl=0)
+    expired.put(CachedUser("1", "u1", 0))
+    assert expired.get("1") is None
+    assert expired.expirations == 1
+
+
+async def test_get_user_reads_through_once():
+    await register_user("1", "ana")
+    user_cache.clear()
+    hits, misses = user_cache.hits, user_cache.misses
+
+    # El primer get_user va a la BD; el segundo sale de la caché
+    assert (await get_user("1")).username == "ana"
+    assert (await get_user("1")).username == "ana"
+    assert (user_cache.hits - hits, user_cache.misses - misses) == (1, 1)
+    assert await get_user("404") is None
+
+
+async def test_increment_thanks_writes_through():
+    await register_user("7", "ana")
+    assert (await get_user("7")).thanks_count == 0
+    await increment_thanks("7", "ana")
+    assert user_cache.get("7").thanks_count == 1
+
+
+def test_put_increment_keeps_newest_total():
+    cache = UserCache()
+    cache.put_increment(CachedUser("1", "ana", 3))
+    cache.put_increment(CachedUser("1", "ana", 2))  # RETURNING desordenado
+    assert cache.get("1").thanks_count == 3